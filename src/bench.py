@@ -0,0 +1,172 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+from case_store import CaseStore
+from paging import ResultPager
+from storage import CsvBackend
+
+# Queries covering the search shapes the index distinguishes.
+SEARCH_QUERIES = ["69*", "6912*", "*@gmail.com", "*.gr", "*maria*", "nikos", "gio", "*21*9*"]
+# Calls of each operation rerun under tracemalloc for its peak memory.
+TRACED_CALLS = 10
+
+
+def percentiles(samples):
+    """p50/p90/p99/max of a list of seconds, in milliseconds."""
+    samples = sorted(samples)
+    if len(samples) > 1:
+        cuts = statistics.quantiles(samples, n=100, method="inclusive")
+        p50, p90, p99 = cuts[49], cuts[89], cuts[98]
+    else:
+        p50 = p90 = p99 = samples[0]
+    return {"p50_ms": p50 * 1000, "p90_ms": p90 * 1000, "p99_ms": p99 * 1000,
+            "max_ms": samples[-1] * 1000, "n": len(samples)}
+
+
+def measure(name, fn, args_list, results, traced=None):
+    """Time fn(*args) for every args in args_list, then trace the memory of fn(*args) for each of traced.
+
+    traced defaults to the first TRACED_CALLS of args_list, which only suits
+    reads: a write repeated on the same arguments is a no-op (or undoes
+    itself), so writes pass spare arguments of their own.
+    """
+    samples = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - start)
+    tracemalloc.start()
+    for args in args_list[:TRACED_CALLS] if traced is None else traced:
+        fn(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    results[name] = dict(percentiles(samples), peak_kb=peak / 1024)
+
+
+def run(csv_path, repeat=50, seed=0):
+    """Exercise the hot paths headlessly (no Tk) against a scratch copy of csv_path."""
+    rng = random.Random(seed)
+    workdir = tempfile.mkdtemp(prefix="crm-bench-")
+    results = {}
+    try:
+        path = os.path.join(workdir, "cases.csv")
+        shutil.copyfile(csv_path, path)
+
+        # load_data: parse the file, build counters and the search index.
+        # Timed without tracemalloc (it slows allocation-heavy code several-fold), then traced once more.
+        start = time.perf_counter()
+        store = CaseStore(CsvBackend(path))
+        elapsed = time.perf_counter() - start
+        tracemalloc.start()
+        CaseStore(CsvBackend(path))
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results["load_data"] = dict(percentiles([elapsed]), peak_kb=peak / 1024)
+        results["rows"] = len(store)
+
+        # snapshot_open: cold start from the mapped snapshot written at compaction.
+        store.compact()
+        measure("snapshot_open", lambda: len(CsvBackend(path).snapshot()), [()] * repeat, results)
+        snapshot = store.backend.snapshot()
+        for query in SEARCH_QUERIES:
+            measure(f"snapshot_search[{query}]", snapshot.search, [(query,)] * max(1, repeat // 10), results)
+        snapshot.close()
+
+        ids = store.ids()
+        sample = [store.get(case_id) for case_id in rng.sample(ids, min(repeat + TRACED_CALLS, len(ids)))]
+        # The spare rows are only edited in save_case's traced calls.
+        sample, spare = sample[:repeat], sample[repeat:]
+
+        # perform_search: one entry per query shape so regressions show which path slowed.
+        for query in SEARCH_QUERIES:
+            measure(f"perform_search[{query}]", store.search, [(query,)] * max(1, repeat // 10), results)
+
+        # update_counts: the two counter lookups done on every FocusOut.
+        measure("update_counts", lambda row: (store.email_count(row["email"]), store.phone_count(row["phone_number"])),
+                [(row,) for row in sample], results)
+
+        # load_results: reset the pager with every id, render the first window and jump around.
+        pager = ResultPager(fetch=store.get)
+
+        def load_results(fraction):
+            pager.reset(ids)
+            pager.window()
+            pager.scroll_to(fraction)
+            pager.window()
+        measure("load_results", load_results, [(rng.random(),) for _ in range(repeat)], results)
+
+        # save_case: half new cases, half edits of existing ones.
+        def edits(rows):
+            return [(dict(row, comments="edited"),) if n % 2 else (dict(row, case_id=uuid.uuid4().hex[:8]),)
+                    for n, row in enumerate(rows)]
+        measure("save_case", store.save, edits(sample), results, traced=edits(spare))
+
+        # delete_case: drop a sample of existing cases, the spare ones under tracemalloc.
+        victims = [(case_id,) for case_id in rng.sample(store.ids(), min(repeat + TRACED_CALLS, len(store)))]
+        victims, spare_victims = victims[:repeat], victims[repeat:]
+        measure("delete_case", store.delete, victims, results, traced=spare_victims)
+
+        # undo_delete: bring the deleted cases back from the history log, each exactly once.
+        measure("undo_delete", store.undo, victims, results, traced=spare_victims)
+
+        store.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def report(results, out=sys.stdout):
+    print(f"{results['rows']} rows", file=out)
+    print(f"{'operation':32} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9} {'peak KiB':>10}", file=out)
+    for name, stats in results.items():
+        if name == "rows":
+            continue
+        print(f"{name:32} {stats['p50_ms']:9.3f} {stats['p90_ms']:9.3f} {stats['p99_ms']:9.3f} "
+              f"{stats['max_ms']:9.3f} {stats['peak_kb']:10.1f}", file=out)
+
+
+def regressions(results, baseline, threshold):
+    """Operations whose p50 grew by more than threshold times the baseline."""
+    slower = []
+    for name, stats in results.items():
+        if name == "rows" or name not in baseline:
+            continue
+        before = baseline[name]["p50_ms"]
+        if before > 0 and stats["p50_ms"] > before * threshold:
+            slower.append(f"{name}: {before:.3f} ms -> {stats['p50_ms']:.3f} ms")
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the CRM hot paths on a cases.csv (see generate_cases.py).")
+    parser.add_argument("csv_path")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="results JSON from an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=1.5, help="allowed p50 slowdown vs the baseline")
+    args = parser.parse_args()
+    results = run(args.csv_path, args.repeat)
+    report(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            slower = regressions(results, json.load(f), args.threshold)
+        for line in slower:
+            print(f"REGRESSION {line}")
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
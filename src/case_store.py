@@ -0,0 +1,385 @@
+import functools
+import threading
+from collections import Counter
+
+from history import History, rewind
+from metrics import timer
+from records import CaseRecord, normalize_email, normalize_phone
+from search_index import SearchIndex
+from storage import CsvBackend
+
+# Rows between progress callbacks while loading.
+PROGRESS_EVERY = 10000
+
+
+def _locked(method):
+    """Serialize access to the store between the Tk thread and the worker pool."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class CaseStore:
+    """In-memory copy of the persisted cases, loaded once and shared by every frame.
+
+    Rows are kept in file order keyed by case_id, as compact CaseRecords. Duplicate counts live in one
+    Counter per normalized email and phone, updated in O(1) on every write; the
+    email_count/phone_count columns are derived from them on demand.
+    get() returns a plain dict copy including the derived counts.
+
+    Persistence is delegated to a backend from storage.py (the journaled CSV by
+    default, monthly partitions, or SQLite), which replays its contents on load and
+    records each write. Archived partitions arrive as summaries: their counts are
+    merged into the counters and their rows are read only when a search needs them.
+    Every write is also recorded in a History next to the backend's files, which
+    undo(), case_at(), view_at() and restore() read without touching other rows.
+    All public methods take the store lock, so they are safe to call from workers.
+    """
+
+    def __init__(self, backend=None, autoload=True):
+        self.backend = backend if backend is not None else CsvBackend()
+        self.lock = threading.RLock()
+        self.loaded = False
+        self.version = 0  # Bumped on every load and write, to invalidate cached results.
+        self._loading = False
+        self.rows = {}                # case_id -> CaseRecord
+        self.email_counts = Counter()  # normalized email -> number of cases
+        self.phone_counts = Counter()  # normalized phone -> number of cases
+        self.index = SearchIndex()
+        self.archives = {}            # partition name -> ArchiveSummary, not loaded yet
+        self.snapshot = None          # CaseSnapshot serving reads until load() finishes, then closed
+        self.history = History(self.backend.history_path)
+        if autoload:
+            self.load()
+
+    def open_snapshot(self):
+        """Map the backend's snapshot (if it has a fresh one) so reads work before load() finishes."""
+        self.snapshot = self.backend.snapshot()
+        return self.snapshot
+
+    @property
+    def reader(self):
+        """Whatever can answer reads right now without waiting on the lock.
+
+        The store itself once loaded, until then its snapshot if it has one. Both
+        offer search, get, email_count, phone_count and len().
+        """
+        if self.loaded or self.snapshot is None:
+            return self
+        return self.snapshot
+
+    @_locked
+    def load(self, progress=None, check=None):
+        """(Re)load every row from the backend and rebuild the counters and index.
+
+        progress(n) is called every PROGRESS_EVERY records; check() may raise to abort.
+        """
+        self.loaded = False
+        self.rows = {}
+        self.email_counts = Counter()
+        self.phone_counts = Counter()
+        self.archives = {}
+        self._loading = True
+        try:
+            # Parsing the backend's records and updating the counters.
+            with timer("store.read") as timing:
+                n = 0
+                for n, (op, payload) in enumerate(self.backend.load(), 1):
+                    if op == "delete":
+                        self._remove(payload)
+                    elif op == "archive":
+                        self._add_archive(payload)
+                    else:
+                        self._put(payload)
+                    if n % PROGRESS_EVERY == 0:
+                        if check is not None:
+                            check()
+                        if progress is not None:
+                            progress(n)
+                timing.rows = n
+        finally:
+            self._loading = False
+        # Build the search index in one pass instead of row by row.
+        with timer("store.index") as timing:
+            self.index.build(self.rows.values())
+            timing.rows = len(self.rows)
+        self.loaded = True
+        self.version += 1
+        # The store answers reads from now on: unmap the snapshot so compaction
+        # can replace its file (which Windows refuses while it is mapped).
+        if self.snapshot is not None:
+            snapshot, self.snapshot = self.snapshot, None
+            snapshot.close(successor=self)
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def archived_rows(self):
+        """Cases in archived partitions that are not loaded."""
+        return sum(summary.rows for summary in self.archives.values())
+
+    @_locked
+    def __contains__(self, case_id):
+        self._load_archives_of(case_id)
+        return case_id in self.rows
+
+    @_locked
+    def get(self, case_id):
+        """Return the row with its derived email_count/phone_count, or None.
+
+        Loads the archived partition holding the case, if any.
+        """
+        self._load_archives_of(case_id)
+        row = self.rows.get(case_id)
+        return self.with_counts(row) if row is not None else None
+
+    def with_counts(self, row):
+        email = normalize_email(row.email)
+        phone = normalize_phone(row.phone_number)
+        return dict(row.to_dict(),
+                    email_count=str(self.email_counts[email]) if email else "",
+                    phone_count=str(self.phone_counts[phone]) if phone else "")
+
+    @_locked
+    def ids(self):
+        """Every case_id, in store order."""
+        return list(self.rows)
+
+    @_locked
+    def email_count(self, email):
+        return self.email_counts.get(normalize_email(email), 0)
+
+    @_locked
+    def phone_count(self, phone):
+        return self.phone_counts.get(normalize_phone(phone), 0)
+
+    @_locked
+    def search(self, query, check=None):
+        """Return the case_ids whose case_id, phone or email match the (lowercase) query.
+
+        Queries containing wildcards are fnmatch patterns; anything else is a substring.
+        Archived partitions are loaded first, but only those with a case that could match.
+        """
+        needed = [name for name, summary in self.archives.items() if summary.matches(query)]
+        if needed:
+            self.load_archives(needed, check=check)
+        return self.index.search(query, check=check)
+
+    @_locked
+    def load_archives(self, names=None, check=None):
+        """Read archived partitions (all by default) into the store and index."""
+        names = list(self.archives) if names is None else [name for name in names if name in self.archives]
+        with timer("store.load_archives") as timing:
+            timing.rows = 0
+            for name in names:
+                if check is not None:
+                    check()
+                records = list(self.backend.load_partition(name))
+                del self.archives[name]
+                # The summary's counts already include these cases; a loaded copy of a case is newer.
+                for record in records:
+                    self._unindex(record)
+                records = [record for record in records if record.case_id not in self.rows]
+                self._loading = True
+                try:
+                    for record in records:
+                        self._put(record)
+                finally:
+                    self._loading = False
+                self.index.extend(records)
+                timing.rows += len(records)
+        if names:
+            self.version += 1
+
+    @_locked
+    def filter(self, case_ids, query, check=None):
+        """Return the case_ids from case_ids that match query, keeping their order."""
+        return self.index.filter(case_ids, query, check=check)
+
+    @_locked
+    def save(self, data):
+        """Insert or replace a row; only the counters of its old and new email/phone change."""
+        # An archived case is replaced like any other, not inserted a second time.
+        self._load_archives_of(data["case_id"])
+        old = self.rows.get(data["case_id"])
+        row = self._put(data)
+        self._commit("update" if old is not None else "insert", row=row, old=old)
+        return row
+
+    @_locked
+    def delete(self, case_id):
+        self._load_archives_of(case_id)
+        row = self._remove(case_id)
+        if row is not None:
+            self._commit("delete", case_id=case_id, old=row)
+        return row
+
+    @_locked
+    def undo(self, case_id):
+        """Revert the latest change to case_id that is not already undone.
+
+        Undoing again goes one change further back. The revert is itself an
+        ordinary write (journaled and recorded); returns the reverted entry, or None.
+        """
+        self._load_archives_of(case_id)
+        undone = set()
+        for entry in self.history.case_entries(case_id):
+            if entry["seq"] in undone:
+                continue
+            if "undoes" in entry:
+                undone.add(entry["undoes"])
+                continue
+            current = self.rows.get(case_id)
+            self._apply(case_id, rewind(current.to_dict() if current else None, [entry]), undoes=entry["seq"])
+            return entry
+        return None
+
+    @_locked
+    def case_at(self, case_id, when):
+        """The case as it was at when (epoch seconds), as a dict, or None if it did not exist."""
+        self._load_archives_of(case_id)
+        newer = []
+        for entry in self.history.case_entries(case_id):
+            if entry["time"] <= when:
+                break
+            newer.append(entry)
+        current = self.rows.get(case_id)
+        return rewind(current.to_dict() if current else None, newer)
+
+    @_locked
+    def view_at(self, when):
+        """Every case as it was at when: case_id -> CaseRecord.
+
+        The current rows with just the cases changed since then rewound.
+        Archived partitions are loaded first.
+        """
+        self.load_archives()
+        view = dict(self.rows)
+        for case_id, row in self._rewound(when).items():
+            if row is None:
+                view.pop(case_id, None)
+            else:
+                view[case_id] = CaseRecord.from_dict(row)
+        return view
+
+    @_locked
+    def restore(self, when, case_ids=None):
+        """Put the given cases (default: every case changed since when) back as they were then.
+
+        Only those cases are written, each as one ordinary write. Returns how many changed.
+        """
+        self.load_archives()
+        rewound = self._rewound(when)
+        if case_ids is not None:
+            rewound = {case_id: rewound[case_id] for case_id in case_ids if case_id in rewound}
+        return sum(self._apply(case_id, row) for case_id, row in rewound.items())
+
+    @_locked
+    def compact(self):
+        with timer("store.compact") as timing:
+            self.backend.compact(self._export())
+            timing.rows = len(self.rows)
+
+    @_locked
+    def close(self):
+        # Never compact a partially loaded store over the full file.
+        self.backend.close(self._export() if self.loaded else None)
+        self.history.close()
+        if self.snapshot is not None:
+            self.snapshot.close()
+            self.snapshot = None
+
+    def _export(self):
+        return (self.with_counts(row) for row in self.rows.values())
+
+    def _commit(self, op, row=None, case_id=None, old=None, undoes=None):
+        self.version += 1
+        data = row.to_dict() if row is not None else None
+        # Journal append + fsync, or the SQLite commit.
+        with timer("store.write"):
+            self.backend.write(op, row=data, case_id=case_id)
+        with timer("store.history"):
+            self.history.record(op, case_id or row.case_id, old.to_dict() if old is not None else None, data, undoes)
+        if self.backend.wants_compaction():
+            self.compact()
+
+    def _apply(self, case_id, data, undoes=None):
+        """Write data (a row dict, or None to delete) as case_id's new state; False if nothing changed.
+
+        An undo is written even when it changes nothing, so the next undo goes further back.
+        """
+        old = self.rows.get(case_id)
+        if data is None:
+            if old is None:
+                return False
+            self._remove(case_id)
+            self._commit("delete", case_id=case_id, old=old, undoes=undoes)
+            return True
+        row = CaseRecord.from_dict(dict(data, case_id=case_id))
+        if undoes is None and old is not None and old.to_dict() == row.to_dict():
+            return False
+        self._put(row)
+        self._commit("update" if old is not None else "insert", row=row, old=old, undoes=undoes)
+        return True
+
+    def _load_archives_of(self, case_id):
+        # Lookups, writes and rewinds all start from the current row, so it must be loaded.
+        needed = [name for name, summary in self.archives.items() if case_id in summary.case_ids]
+        if needed:
+            self.load_archives(needed)
+
+    def _rewound(self, when):
+        """case_id -> row dict (None if absent) as of when, for the cases changed since."""
+        newer = {}
+        for entry in self.history.changes_since(when):
+            newer.setdefault(entry["case_id"], []).append(entry)
+        rewound = {}
+        for case_id, entries in newer.items():
+            current = self.rows.get(case_id)
+            rewound[case_id] = rewind(current.to_dict() if current else None, reversed(entries))
+        return rewound
+
+    def _add_archive(self, summary):
+        self.archives[summary.name] = summary
+        self.email_counts.update(summary.email_counts)
+        self.phone_counts.update(summary.phone_counts)
+        summary.email_counts = summary.phone_counts = None
+
+    def _put(self, data):
+        # Persisted counts are dropped; the counters are the source of truth.
+        row = data if isinstance(data, CaseRecord) else CaseRecord.from_dict(data)
+        old = self.rows.get(row.case_id)
+        if old is not None:
+            self._unindex(old)
+        self.rows[row.case_id] = row
+        self._index(row)
+        if not self._loading:
+            self.index.add(row)
+        return row
+
+    def _remove(self, case_id):
+        row = self.rows.pop(case_id, None)
+        if row is not None:
+            self._unindex(row)
+            if not self._loading:
+                self.index.remove(case_id)
+        return row
+
+    def _index(self, row):
+        email = normalize_email(row.email)
+        phone = normalize_phone(row.phone_number)
+        if email:
+            self.email_counts[email] += 1
+        if phone:
+            self.phone_counts[phone] += 1
+
+    def _unindex(self, row):
+        for counts, key in ((self.email_counts, normalize_email(row.email)),
+                            (self.phone_counts, normalize_phone(row.phone_number))):
+            if key:
+                counts[key] -= 1
+                if counts[key] <= 0:
+                    del counts[key]
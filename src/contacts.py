@@ -0,0 +1,188 @@
+import argparse
+import json
+from collections import defaultdict
+
+from case_store import CaseStore
+from metrics import timer
+from records import normalize_email, normalize_phone
+from storage import open_backend
+
+# Canonical phones shorter than this are too dense for one differing digit to suggest a typo.
+MIN_FUZZY_LENGTH = 8
+# Blocks with more contacts than this are skipped instead of compared pairwise.
+MAX_BLOCK = 100
+# Clusters printed by the command line report.
+REPORT_LIMIT = 20
+
+
+def blocking_keys(value):
+    """value and each copy of it with one character deleted.
+
+    Two values within one edit (substitution, insertion, deletion or swap of
+    neighbours) always share at least one of these keys, so comparing only
+    contacts that share a key finds every such pair without an O(N^2) scan.
+    """
+    if len(value) < MIN_FUZZY_LENGTH:
+        return set()
+    return {value} | {value[:i] + value[i + 1:] for i in range(len(value))}
+
+
+def within_one_edit(a, b):
+    """True if a and b differ by at most one substitution, insertion, deletion or adjacent swap."""
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) < len(b):
+        return a[i:] == b[i + 1:]
+    if a[i + 1:] == b[i + 1:]:
+        return True
+    return a[i] == b[i + 1] and a[i + 1] == b[i] and a[i + 2:] == b[i + 2:]
+
+
+class ContactIndex:
+    """Cases grouped by contact, i.e. canonical (phone, email) pair, with lookups by either key.
+
+    Blocks map each phone blocking key to the contacts having it; they are the
+    only places find_duplicates() compares contacts pairwise.
+    """
+
+    def __init__(self):
+        self.contacts = {}                 # (phone, email) -> case_ids
+        self.phones = defaultdict(list)    # canonical phone -> contacts
+        self.emails = defaultdict(list)    # canonical email -> contacts
+        self.blocks = defaultdict(list)    # phone blocking key -> contacts
+
+    def add(self, case_id, phone, email):
+        contact = (normalize_phone(phone), normalize_email(email))
+        case_ids = self.contacts.get(contact)
+        if case_ids is None:
+            case_ids = self.contacts[contact] = []
+            phone, email = contact
+            if phone:
+                self.phones[phone].append(contact)
+                for key in blocking_keys(phone):
+                    self.blocks[key].append(contact)
+            if email:
+                self.emails[email].append(contact)
+        case_ids.append(case_id)
+
+    def similar_pairs(self):
+        """Yield each pair of contacts whose phones and emails (both present) are within one edit.
+
+        Blocks over MAX_BLOCK are skipped.
+        """
+        seen = set()
+        for block in self.blocks.values():
+            if len(block) < 2 or len(block) > MAX_BLOCK:
+                continue
+            for i, a in enumerate(block):
+                for b in block[i + 1:]:
+                    pair = (a, b) if a < b else (b, a)
+                    if pair in seen or not (a[1] and b[1]):
+                        continue
+                    seen.add(pair)
+                    if within_one_edit(a[0], b[0]) and within_one_edit(a[1], b[1]):
+                        yield pair
+
+
+def find_duplicates(rows, min_cases=2):
+    """Cluster cases that are probably the same contact.
+
+    rows are anything with case_id, phone_number and email attributes
+    (CaseRecords, or the Flask app's Case rows). Cases are linked when they
+    share a canonical phone or email ("phone", "email"), or when both their
+    phones and emails are within one edit of each other ("similar"). Returns
+    the clusters with at least min_cases cases, largest first, as dicts of
+    case_ids, phones, emails and the links (reason, contact, contact) joining them.
+    """
+    with timer("find_duplicates") as timing:
+        index = ContactIndex()
+        timing.rows = 0
+        for row in rows:
+            index.add(row.case_id, row.phone_number, row.email)
+            timing.rows += 1
+        parent = {contact: contact for contact in index.contacts}
+
+        def find(contact):
+            while parent[contact] != contact:
+                parent[contact] = parent[parent[contact]]
+                contact = parent[contact]
+            return contact
+
+        links = []
+
+        def union(reason, a, b):
+            root_a, root_b = find(a), find(b)
+            if root_a != root_b:
+                parent[root_b] = root_a
+                links.append((reason, a, b))
+
+        for reason, groups in (("phone", index.phones), ("email", index.emails)):
+            for contacts in groups.values():
+                for contact in contacts[1:]:
+                    union(reason, contacts[0], contact)
+        for a, b in index.similar_pairs():
+            union("similar", a, b)
+
+        clusters = defaultdict(lambda: {"case_ids": [], "phones": set(), "emails": set(), "links": []})
+        for contact, case_ids in index.contacts.items():
+            cluster = clusters[find(contact)]
+            cluster["case_ids"] += case_ids
+            phone, email = contact
+            if phone:
+                cluster["phones"].add(phone)
+            if email:
+                cluster["emails"].add(email)
+        for reason, a, b in links:
+            clusters[find(a)]["links"].append((reason, a, b))
+        result = []
+        for cluster in clusters.values():
+            if len(cluster["case_ids"]) >= min_cases:
+                cluster["phones"] = sorted(cluster["phones"])
+                cluster["emails"] = sorted(cluster["emails"])
+                result.append(cluster)
+        result.sort(key=lambda cluster: len(cluster["case_ids"]), reverse=True)
+    return result
+
+
+def describe(cluster):
+    """One line per cluster for the text report."""
+    similar = sum(1 for reason, _, _ in cluster["links"] if reason == "similar")
+    contacts = ", ".join(cluster["phones"] + cluster["emails"])
+    note = f" ({similar} by similarity)" if similar else ""
+    return f"{len(cluster['case_ids'])} cases{note}: {contacts}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report clusters of cases that are probably the same contact.")
+    parser.add_argument("--storage", choices=["csv", "partitioned", "sqlite"], help="default: CRM_STORAGE or csv")
+    parser.add_argument("--min-cases", type=int, default=2)
+    parser.add_argument("--limit", type=int, default=REPORT_LIMIT, help="clusters to print")
+    parser.add_argument("--json", help="also write every cluster to this file")
+    args = parser.parse_args()
+    store = CaseStore(open_backend(args.storage))
+    try:
+        store.load_archives()
+        with store.lock:
+            rows = list(store.rows.values())
+    finally:
+        # Read-only: close the backend without compacting.
+        store.backend.close(None)
+    clusters = find_duplicates(rows, args.min_cases)
+    similar = sum(1 for cluster in clusters if any(reason == "similar" for reason, _, _ in cluster["links"]))
+    print(f"{len(clusters)} clusters of {args.min_cases}+ cases among {len(rows)} cases; {similar} joined by similarity")
+    for cluster in clusters[:args.limit]:
+        print(describe(cluster))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(clusters, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
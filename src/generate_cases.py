@@ -0,0 +1,110 @@
+import argparse
+import csv
+import random
+from collections import Counter
+from datetime import datetime, timedelta
+
+from records import normalize_email, normalize_phone
+from storage import FIELDNAMES
+
+DOMAINS = ["gmail.com", "yahoo.gr", "hotmail.com", "outlook.com", "otenet.gr", "acme.com", "accenture.com"]
+FIRST_NAMES = ["maria", "giorgos", "eleni", "nikos", "katerina", "dimitris", "sofia", "kostas", "anna", "victor"]
+LAST_NAMES = ["papadopoulos", "georgiou", "nikolaou", "kaklamanis", "ioannou", "vlachos", "dimitriou"]
+REACTIONS = ["", "I am not interested"]
+RESPONSES = ["", "I will call you back"]
+COMMENTS = ["", "", "Call back after 17:00", "Asked for an offer by email", "Wrong number", "Testing"]
+# How else a number gets typed; all normalize to the same phone.
+PHONE_FORMATS = ["+30 {}", "+30{}", "0030{}", "0030 {}", "+30-{}"]
+
+
+def make_contact(rng, n):
+    name = f"{rng.choice(FIRST_NAMES)}.{rng.choice(LAST_NAMES)}{n}"
+    return f"{name}@{rng.choice(DOMAINS)}", make_phone(rng)
+
+
+def make_phone(rng):
+    # Mostly Greek mobiles (69...), some landlines (21...).
+    prefix = "69" if rng.random() < 0.8 else "21"
+    return prefix + "".join(rng.choice("0123456789") for _ in range(8))
+
+
+def vary_contact(rng, email, phone):
+    """The same contact typed differently: another phone format, email case or +tag, or a slip in both."""
+    kind = rng.random()
+    if kind < 0.45:
+        return email, rng.choice(PHONE_FORMATS + [f"{phone[:3]} {phone[3:6]} {phone[6:]}"]).format(phone)
+    local, domain = email.split("@")
+    if kind < 0.9:
+        return rng.choice([email.upper(), local.capitalize() + "@" + domain, f"{local}+crm@{domain}"]), phone
+    return swap_adjacent(rng, local) + "@" + domain, swap_adjacent(rng, phone)
+
+
+def swap_adjacent(rng, text):
+    i = rng.randrange(len(text) - 1)
+    return text[:i] + text[i + 1] + text[i] + text[i + 2:]
+
+
+def generate(path, rows, contacts_ratio=0.6, tail=3.0, new_phone_rate=0.1, seed=0, days=3 * 365, variant_rate=0.0):
+    """Write a cases.csv with rows cases spread over the last days.
+
+    Cases pick a contact from a pool of rows * contacts_ratio contacts with Pareto
+    weights (shape tail; lower means heavier), so most contacts appear once or twice
+    and a few repeat a lot; new_phone_rate of the cases keep the contact's email but
+    call from a fresh number, and variant_rate of them type the contact differently
+    (see vary_contact).
+    """
+    rng = random.Random(seed)
+    pool = max(1, int(rows * contacts_ratio))
+    contacts = [make_contact(rng, n) for n in range(pool)]
+    weights = [rng.paretovariate(tail) for _ in range(pool)]
+    picks = rng.choices(range(pool), weights=weights, k=rows)
+    phones = [make_phone(rng) if rng.random() < new_phone_rate else contacts[i][1] for i in picks]
+    emails = [contacts[i][0] for i in picks]
+    if variant_rate:
+        for n in range(rows):
+            if rng.random() < variant_rate:
+                emails[n], phones[n] = vary_contact(rng, emails[n], phones[n])
+    email_counts = Counter(map(normalize_email, emails))
+    phone_counts = Counter(map(normalize_phone, phones))
+
+    case_ids = rng.sample(range(1 << 32), rows)
+    start = datetime.now() - timedelta(days=days)
+    step = days * 86400 / max(1, rows)
+    with open(path, "w", newline='', encoding="utf-8") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(FIELDNAMES)
+        for n, (email, phone) in enumerate(zip(emails, phones)):
+            writer.writerow([
+                f"{case_ids[n]:08x}",
+                (start + timedelta(seconds=n * step)).strftime("%Y-%m-%d %H:%M:%S"),
+                phone,
+                email,
+                rng.choice(REACTIONS),
+                rng.choice(RESPONSES),
+                email_counts[normalize_email(email)],
+                phone_counts[normalize_phone(phone)],
+                rng.choice(COMMENTS),
+            ])
+    return email_counts, phone_counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic cases.csv for benchmarking.")
+    parser.add_argument("-o", "--output", default="cases_bench.csv")
+    parser.add_argument("-n", "--rows", type=int, default=10000, help="e.g. 10000, 100000, 1000000")
+    parser.add_argument("--contacts-ratio", type=float, default=0.6, help="distinct contacts per case")
+    parser.add_argument("--tail", type=float, default=3.0, help="Pareto shape of repeat contacts (lower = heavier)")
+    parser.add_argument("--new-phone-rate", type=float, default=0.1)
+    parser.add_argument("--variant-rate", type=float, default=0.0,
+                        help="cases whose contact is typed differently (phone format, email case, typos)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    email_counts, phone_counts = generate(args.output, args.rows, args.contacts_ratio, args.tail,
+                                          args.new_phone_rate, args.seed, variant_rate=args.variant_rate)
+    print(f"Wrote {args.rows} cases to {args.output}: {len(email_counts)} distinct emails "
+          f"(max {max(email_counts.values())} cases), {len(phone_counts)} distinct phones "
+          f"(max {max(phone_counts.values())} cases)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+import argparse
+import json
+import os
+import time
+from bisect import bisect_right
+from collections import deque
+from datetime import datetime
+
+from records import RECORD_FIELDS
+
+# Entries between checkpoints.
+CHECKPOINT_EVERY = 1000
+# Format of the times the command line takes and prints.
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def diff(old, new):
+    """Trim two versions of a row (dicts, None if absent) to the fields that differ."""
+    if old is None or new is None:
+        return old, new
+    changed = [field for field in RECORD_FIELDS if old.get(field, "") != new.get(field, "")]
+    return {field: old.get(field, "") for field in changed}, {field: new.get(field, "") for field in changed}
+
+
+def rewind(row, entries):
+    """The row (dict, or None if absent) as it was before entries, given newest first."""
+    for entry in entries:
+        if entry["op"] == "insert":
+            row = None
+        elif entry["op"] == "delete":
+            row = dict(entry["old"])
+        else:
+            row = dict(row or {}, **entry["old"])
+    return row
+
+
+class History:
+    """Append-only log of case changes, for undo and point-in-time views.
+
+    Each change is one JSON line {"seq", "time", "op", "case_id", "old", "new",
+    "prev"} (plus "undoes": seq for an undo). old and new hold only the fields
+    the change touched, or the whole row for an insert or delete, and prev is
+    the byte offset of the same case's previous entry: one case's history is a
+    chain read backwards from its head, never a scan of the log. Recording a
+    change is a single append.
+
+    Every CHECKPOINT_EVERY entries a line goes to <path>.checkpoints with the
+    log size and time at that point and the heads that moved since the last
+    one, so opening the history reads the checkpoints plus at most
+    CHECKPOINT_EVERY entries, and changes_since() seeks by time. Entries are
+    flushed on every append and fsync'd at checkpoints and close; the journal,
+    not this log, is what makes the change itself durable.
+    """
+
+    def __init__(self, path, checkpoint_every=CHECKPOINT_EVERY):
+        self.path = path
+        self.checkpoint_path = path + ".checkpoints"
+        self.checkpoint_every = checkpoint_every
+        self.heads = None  # case_id -> offset of its latest entry; read on first use
+        self.marks = []    # (time, offset) of every checkpoint, oldest first
+        self.moved = {}    # heads changed since the last checkpoint
+        self.seq = 0
+        self.size = 0      # bytes of complete entries, i.e. where the next one goes
+        self._file = None
+
+    def record(self, op, case_id, old=None, new=None, undoes=None):
+        """Append one change and return its entry; old and new are the whole rows before and after."""
+        self._open()
+        old, new = diff(old, new)
+        entry = {"seq": self.seq + 1, "time": time.time(), "op": op, "case_id": case_id,
+                 "old": old, "new": new, "prev": self.heads.get(case_id)}
+        if undoes is not None:
+            entry["undoes"] = undoes
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+        if self._file is None:
+            self._file = open(self.path, "ab")
+        self._file.write(line)
+        self._file.flush()
+        self.heads[case_id] = self.moved[case_id] = self.size
+        self.size += len(line)
+        self.seq += 1
+        if self.seq % self.checkpoint_every == 0:
+            self.checkpoint()
+        return entry
+
+    def case_entries(self, case_id):
+        """Yield the entries of one case, newest first."""
+        self._open()
+        offset = self.heads.get(case_id)
+        if offset is None:
+            return
+        with open(self.path, "rb") as f:
+            while offset is not None:
+                f.seek(offset)
+                entry = json.loads(f.readline())
+                yield entry
+                offset = entry["prev"]
+
+    def changes_since(self, when):
+        """Yield the entries recorded after when (epoch seconds), oldest first."""
+        self._open()
+        i = bisect_right(self.marks, (when, float("inf")))
+        # Everything before a checkpoint is no newer than its time.
+        start = self.marks[i - 1][1] if i else 0
+        for _, _, entry in self._read(start):
+            if entry["time"] > when:
+                yield entry
+
+    def checkpoint(self):
+        """Sync the log and note its size, the time and the heads moved since the last checkpoint."""
+        self._open()
+        if self._file is not None:
+            os.fsync(self._file.fileno())
+        mark = {"seq": self.seq, "time": time.time(), "offset": self.size, "heads": self.moved}
+        with open(self.checkpoint_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(mark, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.marks.append((mark["time"], self.size))
+        self.moved = {}
+
+    def close(self):
+        if self.moved:
+            self.checkpoint()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _open(self):
+        if self.heads is not None:
+            return
+        self.heads, self.marks, self.moved = {}, [], {}
+        self.seq = self.size = 0
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, "rb") as f:
+                for line in f:
+                    try:
+                        mark = json.loads(line) if line.endswith(b"\n") else None
+                    except ValueError:
+                        mark = None
+                    if mark is None:
+                        break  # Torn write from a crash mid-checkpoint.
+                    self.heads.update(mark["heads"])
+                    self.marks.append((mark["time"], mark["offset"]))
+                    self.seq, self.size = mark["seq"], mark["offset"]
+        if self.size > (os.path.getsize(self.path) if os.path.exists(self.path) else 0):
+            # The log was replaced or cut short behind the checkpoints' back: start them over.
+            os.remove(self.checkpoint_path)
+            self.heads, self.marks = {}, []
+            self.seq = self.size = 0
+        for offset, length, entry in self._read(self.size):
+            self.heads[entry["case_id"]] = self.moved[entry["case_id"]] = offset
+            self.seq = entry["seq"]
+            self.size = offset + length
+        # Cut off a torn tail so new appends start on a clean line.
+        if os.path.exists(self.path) and os.path.getsize(self.path) != self.size:
+            with open(self.path, "r+b") as f:
+                f.truncate(self.size)
+
+    def _read(self, start):
+        """Yield (offset, length, entry) for each complete entry from byte start on."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            offset = start
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                yield offset, len(line), entry
+                offset += len(line)
+
+
+def describe(entry):
+    """One line per entry for the command line log."""
+    when = datetime.fromtimestamp(entry["time"]).strftime(TIME_FORMAT)
+    fields = ", ".join(f"{field}: {entry['old'].get(field, '')!r} -> {value!r}"
+                       for field, value in entry["new"].items()) if entry["op"] == "update" else ""
+    undo = f" (undoes #{entry['undoes']})" if "undoes" in entry else ""
+    return f"#{entry['seq']} {when} {entry['op']} {entry['case_id']}{undo} {fields}".rstrip()
+
+
+def main():
+    # case_store imports this module.
+    from case_store import CaseStore
+    from storage import open_backend
+
+    parser = argparse.ArgumentParser(description="Show, undo or roll back case changes.")
+    parser.add_argument("--storage", choices=["csv", "partitioned", "sqlite"], help="default: CRM_STORAGE or csv")
+    commands = parser.add_subparsers(dest="command", required=True)
+    log = commands.add_parser("log", help="recent changes, or every change of one case")
+    log.add_argument("case_id", nargs="?")
+    log.add_argument("-n", "--limit", type=int, default=20)
+    undo = commands.add_parser("undo", help="revert the latest change of a case")
+    undo.add_argument("case_id")
+    restore = commands.add_parser("restore", help="put one case, or every case, back as it was at a time")
+    restore.add_argument("case_id", nargs="?")
+    restore.add_argument("--at", required=True, help=f"local time, {TIME_FORMAT.replace('%', '%%')}")
+    args = parser.parse_args()
+
+    store = CaseStore(open_backend(args.storage), autoload=args.command != "log")
+    try:
+        if args.command == "log":
+            if args.case_id:
+                entries = list(store.history.case_entries(args.case_id))[:args.limit]
+            else:
+                entries = reversed(deque(store.history.changes_since(0), maxlen=args.limit))
+            for entry in entries:
+                print(describe(entry))
+        elif args.command == "undo":
+            entry = store.undo(args.case_id)
+            print(f"Reverted {describe(entry)}" if entry else f"Nothing to undo for {args.case_id}")
+        else:
+            when = datetime.strptime(args.at, TIME_FORMAT).timestamp()
+            case_ids = [args.case_id] if args.case_id else None
+            print(f"Restored {store.restore(when, case_ids)} cases as of {args.at}")
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import json
+import os
+
+
+class Journal:
+    """Append-only write-ahead log of case changes kept next to the cases file.
+
+    Each commit is one JSON line ({"op": "insert"|"update"|"delete", ...}) that is
+    flushed and fsync'd before the call returns. A torn last line left by a crash
+    is ignored on replay.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = 0
+        self._file = None
+
+    def append(self, op, row=None, case_id=None):
+        record = {"op": op}
+        if row is not None:
+            record["row"] = row
+        if case_id is not None:
+            record["case_id"] = case_id
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.entries += 1
+
+    def replay(self):
+        """Yield every complete record in commit order."""
+        self.entries = 0
+        if not os.path.exists(self.path):
+            return
+        good = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # Torn write from a crash mid-append.
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                good += len(line)
+                self.entries += 1
+                yield record
+        # Cut off a torn tail so new appends start on a clean line.
+        if good != os.path.getsize(self.path):
+            with open(self.path, "r+b") as f:
+                f.truncate(good)
+
+    def truncate(self):
+        """Drop every record once they have been compacted into the cases file."""
+        self.close()
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.flush()
+            os.fsync(f.fileno())
+        self.entries = 0
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __len__(self):
+        return self.entries
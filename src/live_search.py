@@ -0,0 +1,64 @@
+from collections import OrderedDict
+
+from search_index import _literals
+
+# Recent query -> case_ids results kept per store version.
+CACHE_SIZE = 64
+
+
+def refines(previous, query):
+    """True if every value matching query also matches previous.
+
+    Only cases that are certain are recognised, so a False just means a full search:
+    - "abc" -> "abcd" or "xabc": a plain substring that contains the previous one.
+    - "abc" -> "*abcd*": a pattern with a literal run containing the previous substring.
+    - "69*" -> "69*1" or "69*1*": a pattern ending in "*" with more appended after it.
+    """
+    if query == previous:
+        return True
+    if "*" not in previous:
+        if "*" not in query:
+            return previous in query
+        return any(previous in run for run in _literals(query))
+    return previous.endswith("*") and query.startswith(previous)
+
+
+class LiveSearch:
+    """Search-as-you-type on top of CaseStore.
+
+    A query that refines the previous one filters the previous result list
+    instead of searching the whole store, and recent results are kept in an
+    LRU cache that is dropped whenever the store changes.
+    """
+
+    def __init__(self, store, cache_size=CACHE_SIZE):
+        self.store = store
+        self.cache_size = cache_size
+        self.cache = OrderedDict()  # query -> list of case_ids
+        self.version = None
+        self.previous = None  # (query, case_ids) of the last search
+
+    def search(self, query, check=None):
+        """Return the case_ids matching query (already lowercased), in store order."""
+        reader = self.store.reader
+        if reader is not self.store:
+            # Still loading: scan the snapshot, without the store lock or the cache.
+            return reader.search(query, check=check)
+        with self.store.lock:
+            if self.version != self.store.version:
+                # Any write invalidates every cached result.
+                self.cache.clear()
+                self.previous = None
+                self.version = self.store.version
+            if query in self.cache:
+                self.cache.move_to_end(query)
+                results = self.cache[query]
+            elif self.previous is not None and refines(self.previous[0], query):
+                results = self.store.filter(self.previous[1], query, check=check)
+            else:
+                results = self.store.search(query, check=check)
+            self.cache[query] = results
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+            self.previous = (query, results)
+            return results
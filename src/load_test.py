@@ -0,0 +1,104 @@
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+from bench import percentiles
+
+OPERATIONS = ("create_case", "get_case")
+
+
+def create_case(conn, rng, case_ids):
+    body = urlencode({
+        "phone_number": "69" + "".join(rng.choice("0123456789") for _ in range(8)),
+        "email": f"load{rng.randrange(10000)}@example.com",
+        "main_reaction": "",
+        "main_response": "",
+        "comments": "load test",
+    })
+    conn.request("POST", "/create_case", body, {"Content-Type": "application/x-www-form-urlencoded"})
+    return conn.getresponse()
+
+
+def get_case(conn, rng, case_ids):
+    conn.request("GET", f"/case/{rng.choice(case_ids)}")
+    return conn.getresponse()
+
+
+def fetch_case_ids(host, port, limit=500):
+    conn = http.client.HTTPConnection(host, port)
+    try:
+        conn.request("GET", f"/api/cases?fields=case_id&limit={limit}")
+        return [case["case_id"] for case in json.load(conn.getresponse())["cases"]]
+    finally:
+        conn.close()
+
+
+def run(url, operation, clients=8, duration=10.0, seed=0):
+    """Hit one operation from clients threads (one keep-alive connection each) for duration seconds."""
+    parts = urlsplit(url)
+    case_ids = fetch_case_ids(parts.hostname, parts.port) if operation == "get_case" else []
+    if operation == "get_case" and not case_ids:
+        raise SystemExit("No cases to fetch; run the create_case test first")
+    send = {"create_case": create_case, "get_case": get_case}[operation]
+    samples, errors = [], []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(n):
+        rng = random.Random(seed + n)
+        conn = http.client.HTTPConnection(parts.hostname, parts.port)
+        mine, failed = [], []
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                response = send(conn, rng, case_ids)
+                response.read()
+            except (OSError, http.client.HTTPException) as e:
+                failed.append(type(e).__name__)
+                conn.close()
+                conn = http.client.HTTPConnection(parts.hostname, parts.port)
+                continue
+            if response.status >= 400:
+                failed.append(str(response.status))
+            else:
+                mine.append(time.perf_counter() - start)
+        conn.close()
+        with lock:
+            samples.extend(mine)
+            errors.extend(failed)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    result = dict(percentiles(samples) if samples else {"n": 0}, errors=len(errors))
+    result["requests_per_sec"] = len(samples) / elapsed
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure requests/sec of the Flask app under concurrent clients.")
+    parser.add_argument("url", nargs="?", default="http://127.0.0.1:8000")
+    parser.add_argument("-c", "--clients", type=int, default=8)
+    parser.add_argument("-d", "--duration", type=float, default=10.0, help="seconds per operation")
+    parser.add_argument("--only", choices=OPERATIONS)
+    args = parser.parse_args()
+    print(f"{'operation':12} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9} {'errors':>7}")
+    for operation in [args.only] if args.only else OPERATIONS:
+        stats = run(args.url, operation, args.clients, args.duration)
+        if not stats["n"]:
+            print(f"{operation:12} {0:9.1f} {'-':>9} {'-':>9} {'-':>9} {stats['errors']:7}")
+            continue
+        print(f"{operation:12} {stats['requests_per_sec']:9.1f} {stats['p50_ms']:9.2f} {stats['p99_ms']:9.2f} "
+              f"{stats['max_ms']:9.2f} {stats['errors']:7}")
+
+
+if __name__ == "__main__":
+    main()
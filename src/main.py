@@ -1,14 +1,27 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import csv
-import os
 from datetime import datetime
 import uuid
-import fnmatch  # For wildcard matching
 
-CSV_FILE = "cases.csv"
-# Updated CSV schema: two separate count fields.
-FIELDNAMES = ["case_id", "timestamp", "phone_number", "email", "main_reaction", "main_response", "email_count", "phone_count", "comments"]
+from case_store import CaseStore
+from live_search import LiveSearch
+from metrics import metrics, profile_report, timed, timer
+from paging import ResultPager
+from storage import open_backend
+from workers import TaskRunner
+
+# Live search waits this long after the last keystroke, and previews this many matches.
+LIVE_DELAY_MS = 250
+LIVE_PREVIEW = 10
+# Status bar: refresh interval and the operations it summarizes (p50/p99).
+STATUS_MS = 1000
+STATUS_OPERATIONS = ("perform_search", "update_counts", "save_case", "delete_case", "load_results")
+# Saves and deletes of this session that the Undo button (Ctrl+Z) can take back, newest last.
+UNDO_LIMIT = 50
+# F11 writes the metrics dump here; F12 toggles cProfile and saves the stats and their report here.
+METRICS_FILE = "crm_metrics.prom"
+PROFILE_FILE = "crm.prof"
+PROFILE_REPORT_FILE = "crm.prof.txt"
 
 # Global validation: limit input length to 100 characters.
 def max100(new_text):
@@ -22,8 +35,25 @@ class LoggingApp(tk.Tk):
         self.grid_rowconfigure(0, weight=1)
         self.grid_columnconfigure(0, weight=1)
 
+        # Single in-memory case store shared by every frame; CRM_STORAGE picks csv or sqlite.
+        self.store = CaseStore(open_backend(), autoload=False)
+        # Incremental search with an LRU cache of recent queries, shared by every search.
+        self.live_search = LiveSearch(self.store)
+        # Store queries run on worker threads; results come back through after().
+        self.runner = TaskRunner(self)
+        # case_ids saved or deleted in this session, for Undo.
+        self.changed = []
+
         self.container = tk.Frame(self)
         self.container.grid(row=0, column=0, sticky="nsew")
+        # Bottom: per-operation latencies, refreshed every STATUS_MS.
+        self.status_label = tk.Label(self, text="", anchor="w", font=("Helvetica", 8))
+        self.status_label.grid(row=1, column=0, sticky="ew")
+        self.status_note = ""
+        self.bind("<F11>", lambda event: self.dump_metrics())
+        self.bind("<F12>", lambda event: self.toggle_profiling())
+        self.bind("<Control-z>", self.on_undo_key)
+        self.update_status()
 
         self.frames = {}
         for F in (MainFrame, NewCaseFrame, ResultsFrame):
@@ -31,6 +61,78 @@ class LoggingApp(tk.Tk):
             self.frames[F] = frame
             frame.grid(row=0, column=0, sticky="nsew")
         self.show_frame(MainFrame)
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        # The snapshot gives the count and answers reads while the full load runs.
+        self.store.open_snapshot()
+        self.frames[MainFrame].load_data()
+        self.load_store()
+
+    def load_store(self):
+        """Load the cases in the background, reporting progress on the main frame."""
+        main_frame = self.frames[MainFrame]
+
+        @timed("load_data", rows=lambda result: len(self.store))
+        def load(task):
+            self.store.load(progress=task.progress, check=task.check)
+
+        def progress(n):
+            # With a snapshot the real count is already shown; keep it.
+            if self.store.snapshot is None:
+                main_frame.data_label.config(text=f"Loading cases... {n}")
+
+        self.runner.submit(load, key="load", on_progress=progress,
+                           on_done=lambda result: main_frame.load_data(),
+                           on_error=lambda e: messagebox.showerror("Load", f"Could not load cases: {e}"))
+
+    def update_status(self):
+        line = metrics.status_line(STATUS_OPERATIONS)
+        self.status_label.config(text=f"{self.status_note}  {line}" if self.status_note else line)
+        self.after(STATUS_MS, self.update_status)
+
+    def dump_metrics(self):
+        with open(METRICS_FILE, "w", encoding="utf-8") as f:
+            f.write(metrics.render_text())
+        self.status_note = f"Metrics written to {METRICS_FILE}"
+
+    def toggle_profiling(self):
+        """Start cProfile on every timed operation, or stop and save the merged stats."""
+        if not metrics.profiling:
+            metrics.start_profiling()
+            self.status_note = "Profiling (F12 to stop)"
+            return
+        stats = metrics.stop_profiling()
+        if stats is None:
+            self.status_note = "Profiling stopped: nothing ran"
+            return
+        stats.dump_stats(PROFILE_FILE)
+        with open(PROFILE_REPORT_FILE, "w", encoding="utf-8") as f:
+            f.write(profile_report(stats))
+        self.status_note = f"Profile saved to {PROFILE_FILE}, top functions in {PROFILE_REPORT_FILE}"
+
+    def on_undo_key(self, event):
+        # The binding is on the window, so it also sees Ctrl+Z typed into text fields; leave those alone.
+        if isinstance(event.widget, (tk.Entry, tk.Text, ttk.Entry)):
+            return
+        self.frames[MainFrame].undo_last()
+
+    def open_case(self, case_id, previous_frame):
+        """Look the case up on a worker (the store may be busy), then show it in the case form."""
+        store = self.store
+
+        def show(record):
+            if record:
+                self.frames[NewCaseFrame].load_case_data(record, previous_frame=previous_frame)
+                self.show_frame(NewCaseFrame)
+
+        self.runner.submit(lambda task: store.reader.get(case_id), key="open_case", on_done=show,
+                           on_error=lambda e: messagebox.showerror("Error", str(e)))
+
+    def on_close(self):
+        # Cancel pending reads and let queued saves/deletes finish, then flush the writes
+        # (e.g. compact the CSV journal).
+        self.runner.shutdown()
+        self.store.close()
+        self.destroy()
 
     def show_frame(self, frame_class):
         frame = self.frames[frame_class]
@@ -55,6 +157,9 @@ class MainFrame(tk.Frame):
                                   width=4, height=1,
                                   command=lambda: self.controller.frames[NewCaseFrame].load_case_data(None, previous_frame="MainFrame") or self.controller.show_frame(NewCaseFrame))
         create_button.pack(anchor="w", pady=10)
+        # Takes back the latest save or delete of this session.
+        self.undo_button = tk.Button(main_container, text="Undo", state="disabled", command=self.undo_last)
+        self.undo_button.pack(anchor="w")
 
         # Below that: search row.
         search_frame = tk.Frame(main_container)
@@ -66,10 +171,25 @@ class MainFrame(tk.Frame):
         search_entry.pack(side="left", padx=5)
         # Bind Enter key to trigger search.
         search_entry.bind("<Return>", lambda event: self.perform_search())
+        # Any other key refreshes the live results once typing pauses.
+        search_entry.bind("<KeyRelease>", self.schedule_live_search)
         search_button = tk.Button(search_frame, text="Search", command=self.perform_search)
         search_button.pack(side="left", padx=5)
         browse_all_button = tk.Button(search_frame, text="Browse All", command=self.browse_all)
         browse_all_button.pack(side="left", padx=5)
+        self.live_var = tk.BooleanVar(value=True)
+        live_check = tk.Checkbutton(search_frame, text="Live", variable=self.live_var,
+                                    command=self.schedule_live_search)
+        live_check.pack(side="left", padx=5)
+        self.live_after = None
+
+        # Below the search row: live results preview.
+        self.live_label = tk.Label(main_container, text="", font=("Helvetica", 8))
+        self.live_label.pack(anchor="w")
+        self.live_list = tk.Listbox(main_container, height=LIVE_PREVIEW, width=80)
+        self.live_list.pack(anchor="w", fill="x")
+        self.live_list.bind("<Double-1>", self.on_live_double_click)
+        self.live_ids = []
 
         # Bottom: loaded cases count.
         self.data_label = tk.Label(main_container, text="Loaded 0 cases", font=("Helvetica", 8, "italic"))
@@ -77,13 +197,16 @@ class MainFrame(tk.Frame):
         self.load_data()
 
     def load_data(self):
-        if os.path.exists(CSV_FILE):
-            with open(CSV_FILE, newline='', encoding="utf-8") as csvfile:
-                reader = csv.DictReader(csvfile)
-                cases = list(reader)
-            self.data_label.config(text=f"Loaded {len(cases)} cases")
+        store = self.controller.store
+        # load() drops the snapshot when it finishes, possibly between these checks.
+        snapshot = store.snapshot
+        if store.loaded:
+            archived = f" (+{store.archived_rows} archived)" if store.archives else ""
+            self.data_label.config(text=f"Loaded {len(store)} cases{archived}")
+        elif snapshot is not None:
+            self.data_label.config(text=f"Loaded {len(snapshot)} cases (indexing...)")
         else:
-            self.data_label.config(text="Loaded 0 cases")
+            self.data_label.config(text="Loading cases...")
 
     def perform_search(self):
         query = self.search_var.get().strip().lower()
@@ -91,45 +214,141 @@ class MainFrame(tk.Frame):
             messagebox.showinfo("Search", "Please enter a search query.")
             return
 
-        results = []
-        if os.path.exists(CSV_FILE):
-            with open(CSV_FILE, newline='', encoding="utf-8") as csvfile:
-                reader = csv.DictReader(csvfile)
-                for row in reader:
-                    # Use wildcard matching if "*" is in the query.
-                    if "*" in query:
-                        if (fnmatch.fnmatch(row.get("case_id", "").lower(), query) or
-                            fnmatch.fnmatch(row.get("phone_number", "").lower(), query) or
-                            fnmatch.fnmatch(row.get("email", "").lower(), query)):
-                            results.append(row)
-                    else:
-                        if (query in row.get("case_id", "").lower() or
-                            query in row.get("phone_number", "").lower() or
-                            query in row.get("email", "").lower()):
-                            results.append(row)
+        store = self.controller.store
+
+        @timed("perform_search", rows=lambda result: len(result[0]))
+        def search(task):
+            results = self.controller.live_search.search(query, check=task.check)
+            # Fetch a single hit here too, so the Tk thread never waits on the store.
+            return results, store.reader.get(results[0]) if len(results) == 1 else None
+
         # Clear search box.
         self.search_var.set("")
+        self.clear_live_results()
+        self.data_label.config(text="Searching...")
+        # A newer search (or browse) cancels this one.
+        self.controller.runner.submit(search, key="search", on_done=self.show_search_results,
+                                      on_error=self.show_error)
+
+    def schedule_live_search(self, event=None):
+        """Debounce keystrokes: search only once typing pauses for LIVE_DELAY_MS."""
+        if event is not None and event.keysym == "Return":
+            return
+        if self.live_after is not None:
+            self.after_cancel(self.live_after)
+        self.live_after = self.after(LIVE_DELAY_MS, self.live_search)
+
+    def live_search(self):
+        self.live_after = None
+        query = self.search_var.get().strip().lower()
+        if not self.live_var.get() or not query:
+            self.clear_live_results()
+            return
+        store = self.controller.store
+
+        @timed("live_search", rows=lambda result: len(result[0]))
+        def search(task):
+            results = self.controller.live_search.search(query, check=task.check)
+            reader = store.reader
+            return results, [reader.get(case_id) for case_id in results[:LIVE_PREVIEW]]
+
+        # Each keystroke's search replaces the previous one.
+        self.controller.runner.submit(search, key="live", on_done=self.show_live_results,
+                                      on_error=self.show_error)
+
+    def show_live_results(self, result):
+        results, rows = result
+        if not self.search_var.get().strip():
+            # The box was cleared (e.g. by Enter) while this search ran.
+            return
+        self.live_ids = [row["case_id"] for row in rows if row is not None]
+        self.live_list.delete(0, "end")
+        for row in rows:
+            if row is not None:
+                self.live_list.insert("end", f'{row["case_id"]}    {row["email"]}    {row["phone_number"]}')
+        more = f" (showing {len(self.live_ids)}, press Enter for all)" if len(results) > LIVE_PREVIEW else ""
+        self.live_label.config(text=f"{len(results)} matches{more}")
+
+    def clear_live_results(self):
+        if self.live_after is not None:
+            self.after_cancel(self.live_after)
+            self.live_after = None
+        self.live_ids = []
+        self.live_list.delete(0, "end")
+        self.live_label.config(text="")
+
+    def on_live_double_click(self, event):
+        selection = self.live_list.curselection()
+        if selection:
+            self.controller.open_case(self.live_ids[selection[0]], previous_frame="MainFrame")
+
+    def show_search_results(self, result):
+        results, record = result
+        self.load_data()
         if not results:
             messagebox.showinfo("Search", "No results found.")
         elif len(results) == 1:
-            self.controller.frames[NewCaseFrame].load_case_data(results[0], previous_frame="MainFrame")
+            self.controller.frames[NewCaseFrame].load_case_data(record, previous_frame="MainFrame")
             self.controller.show_frame(NewCaseFrame)
         else:
             self.controller.frames[ResultsFrame].load_results("Search results", results)
             self.controller.show_frame(ResultsFrame)
 
     def browse_all(self):
-        results = []
-        if os.path.exists(CSV_FILE):
-            with open(CSV_FILE, newline='', encoding="utf-8") as csvfile:
-                reader = csv.DictReader(csvfile)
-                results = list(reader)
+        self.data_label.config(text="Loading entries...")
+        store = self.controller.store
+
+        @timed("browse_all", rows=len)
+        def browse(task):
+            # Every case, so every archived partition too.
+            store.load_archives(check=task.check)
+            return store.ids()
+
+        self.controller.runner.submit(browse, key="search",
+                                      on_done=self.show_all, on_error=self.show_error)
+
+    def show_all(self, results):
+        self.load_data()
         if not results:
             messagebox.showinfo("Browse All", "No entries found.")
         else:
             self.controller.frames[ResultsFrame].load_results("All entries", results)
             self.controller.show_frame(ResultsFrame)
 
+    def show_error(self, error):
+        self.load_data()
+        messagebox.showerror("Error", str(error))
+
+    def note_change(self, case_id):
+        changed = self.controller.changed
+        changed.append(case_id)
+        del changed[:-UNDO_LIMIT]
+        self.update_undo()
+
+    def update_undo(self):
+        changed = self.controller.changed
+        if changed:
+            self.undo_button.config(state="normal", text=f"Undo ({changed[-1]})")
+        else:
+            self.undo_button.config(state="disabled", text="Undo")
+
+    def undo_last(self):
+        changed = self.controller.changed
+        if not changed:
+            return
+        case_id = changed.pop()
+        self.update_undo()
+        undo = timed("undo", rows=lambda entry: 0 if entry is None else 1)(
+            lambda task: self.controller.store.undo(case_id))
+        self.controller.runner.submit(undo, on_done=self.on_undone,
+                                      on_error=lambda e: messagebox.showerror("Undo", f"Could not undo: {e}"))
+
+    def on_undone(self, entry):
+        self.load_data()
+        self.schedule_live_search()
+        if entry is not None:
+            self.controller.status_note = f"Undid {entry['op']} of {entry['case_id']}"
+
 
 class NewCaseFrame(tk.Frame):
     def __init__(self, parent, controller):
@@ -269,16 +488,17 @@ class NewCaseFrame(tk.Frame):
         """Update the counters based on the current email and phone values."""
         email = self.email_var.get().strip().lower()
         phone = self.phone_var.get().strip()
-        email_count = 0
-        phone_count = 0
-        if os.path.exists(CSV_FILE):
-            with open(CSV_FILE, newline='', encoding="utf-8") as csvfile:
-                reader = csv.DictReader(csvfile)
-                for row in reader:
-                    if email and row.get("email", "").strip().lower() == email:
-                        email_count += 1
-                    if phone and row.get("phone_number", "").strip() == phone:
-                        phone_count += 1
+        store = self.controller.store
+        counts = timed("update_counts")(
+            lambda task: (store.reader.email_count(email) if email else 0,
+                          store.reader.phone_count(phone) if phone else 0))
+        self.controller.runner.submit(
+            counts,
+            key="counts",
+            on_done=lambda counts: self.show_counts(email, phone, *counts),
+            on_error=lambda e: messagebox.showerror("Error", f"Could not count duplicates: {e}"))
+
+    def show_counts(self, email, phone, email_count, phone_count):
         # For a new case, include this unsaved record.
         if self.current_case is None:
             if email:
@@ -290,25 +510,7 @@ class NewCaseFrame(tk.Frame):
 
     def save_case(self):
         """Save (or update) the current record and update counters across matching records."""
-        email = self.email_var.get().strip().lower()
         phone = self.phone_var.get().strip()
-        rows = []
-        if os.path.exists(CSV_FILE):
-            with open(CSV_FILE, newline='', encoding="utf-8") as csvfile:
-                reader = csv.DictReader(csvfile)
-                rows = list(reader)
-        email_count = sum(1 for row in rows if row.get("email", "").strip().lower() == email)
-        phone_count = sum(1 for row in rows if row.get("phone_number", "").strip() == phone)
-        if self.current_case is None:
-            if email:
-                email_count += 1
-            if phone:
-                phone_count += 1
-        for row in rows:
-            if email and row.get("email", "").strip().lower() == email:
-                row["email_count"] = str(email_count)
-            if phone and row.get("phone_number", "").strip() == phone:
-                row["phone_count"] = str(phone_count)
         data = {
             "case_id": self.case_id_var.get(),
             "timestamp": self.timestamp_var.get(),
@@ -316,37 +518,32 @@ class NewCaseFrame(tk.Frame):
             "email": self.email_var.get().strip(),
             "main_reaction": self.main_reaction_combo.get() if self.main_reaction_combo.get() != "Select an option" else "",
             "main_response": self.main_response_combo.get() if self.main_response_combo.get() != "Select an option" else "",
-            "email_count": str(email_count),
-            "phone_count": str(phone_count),
             "comments": self.comments_text.get("1.0", "end").strip()
         }
-        updated = False
-        for i, row in enumerate(rows):
-            if row.get("case_id") == data["case_id"]:
-                rows[i] = data
-                updated = True
-                break
-        if not updated:
-            rows.append(data)
-        with open(CSV_FILE, "w", newline='', encoding="utf-8") as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=FIELDNAMES)
-            writer.writeheader()
-            writer.writerows(rows)
+        # email_count/phone_count are derived from the store's counters.
+        save = timed("save_case", rows=lambda row: 1)(lambda task: self.controller.store.save(data))
+        self.controller.runner.submit(save,
+                                      on_done=self.on_saved,
+                                      on_error=lambda e: messagebox.showerror("Save", f"Could not save case: {e}"))
+
+    def on_saved(self, row):
+        self.controller.frames[MainFrame].note_change(row.case_id)
         self.controller.frames[MainFrame].load_data()
         self.controller.show_frame(MainFrame)
 
     def delete_case(self):
         """Immediately delete the current record and then return to the previous interface."""
         case_id = self.case_id_var.get()
-        rows = []
-        if os.path.exists(CSV_FILE):
-            with open(CSV_FILE, newline='', encoding="utf-8") as csvfile:
-                reader = csv.DictReader(csvfile)
-                rows = [row for row in reader if row.get("case_id") != case_id]
-        with open(CSV_FILE, "w", newline='', encoding="utf-8") as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=FIELDNAMES)
-            writer.writeheader()
-            writer.writerows(rows)
+        delete = timed("delete_case", rows=lambda row: 0 if row is None else 1)(
+            lambda task: self.controller.store.delete(case_id))
+        self.controller.runner.submit(delete,
+                                      on_done=self.on_deleted,
+                                      on_error=lambda e: messagebox.showerror("Delete", f"Could not delete case: {e}"))
+
+    def on_deleted(self, row):
+        if row is not None:
+            self.controller.frames[MainFrame].note_change(row.case_id)
+        self.controller.frames[MainFrame].load_data()
         self.go_back()
 
     def go_back(self):
@@ -364,43 +561,79 @@ class ResultsFrame(tk.Frame):
         container.pack(expand=True, fill="both", padx=10, pady=10)
         self.results_label = tk.Label(container, text="", font=("Helvetica", 14))
         self.results_label.pack(anchor="w", pady=5)
+        # The tree only ever holds the visible window of results; the scrollbar drives the pager.
+        tree_frame = tk.Frame(container)
+        tree_frame.pack(expand=True, fill="both")
         columns = ("case_id", "email", "phone_number", "timestamp")
-        self.tree = ttk.Treeview(container, columns=columns, show="headings")
+        self.tree = ttk.Treeview(tree_frame, columns=columns, show="headings")
         for col in columns:
             self.tree.heading(col, text=col.capitalize())
             self.tree.column(col, width=150)
-        self.tree.pack(expand=True, fill="both")
+        self.scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=self.on_scroll)
+        self.scrollbar.pack(side="right", fill="y")
+        self.tree.pack(side="left", expand=True, fill="both")
         self.tree.bind("<Double-1>", self.on_row_double_click)
+        self.tree.bind("<Configure>", self.on_resize)
+        self.tree.bind("<MouseWheel>", lambda event: self.scroll_rows(-3 if event.delta > 0 else 3))
+        self.tree.bind("<Button-4>", lambda event: self.scroll_rows(-3))
+        self.tree.bind("<Button-5>", lambda event: self.scroll_rows(3))
+        self.pager = ResultPager(fetch=lambda case_id: self.controller.store.reader.get(case_id))
         back_button = tk.Button(container, text="Back", command=lambda: self.controller.show_frame(MainFrame))
         back_button.pack(pady=5)
 
     def load_results(self, header, results):
-        self.results_label.config(text=header)
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        for row in results:
-            self.tree.insert("", "end", values=(row.get("case_id", ""),
-                                                row.get("email", ""),
-                                                row.get("phone_number", ""),
-                                                row.get("timestamp", "")))
+        """Show a list of case_ids; rows are fetched only as they scroll into view."""
+        with timer("load_results") as timing:
+            self.results_label.config(text=f"{header} ({len(results)} cases)")
+            self.pager.reset(results)
+            self.render()
+            timing.rows = len(results)
+
+    def render(self):
+        """Fetch the visible rows on a worker, then draw them; a newer scroll supersedes the fetch."""
+        ids = self.pager.visible_ids()
+        self.scrollbar.set(*self.pager.fractions())
+        self.controller.runner.submit(lambda task: self.pager.window(ids), key="results_window", on_done=self.draw,
+                                      on_error=lambda e: messagebox.showerror("Error", str(e)))
+
+    def draw(self, window):
+        # Treeview insertion of the visible window, also timed on every scroll.
+        with timer("render_results") as timing:
+            for item in self.tree.get_children():
+                self.tree.delete(item)
+            for case_id, row in window:
+                # Use the case_id as the item id so double-click can look the record up directly.
+                self.tree.insert("", "end", iid=case_id, values=(row.get("case_id", ""),
+                                                                 row.get("email", ""),
+                                                                 row.get("phone_number", ""),
+                                                                 row.get("timestamp", "")))
+            timing.rows = len(window)
+
+    def on_scroll(self, action, amount, unit=None):
+        """Scrollbar command: ("moveto", fraction) or ("scroll", n, "units"/"pages")."""
+        if action == "moveto":
+            self.pager.scroll_to(float(amount))
+        elif unit == "pages":
+            self.pager.scroll_by(int(amount) * self.pager.page_size)
+        else:
+            self.pager.scroll_by(int(amount))
+        self.render()
+
+    def scroll_rows(self, rows):
+        self.pager.scroll_by(rows)
+        self.render()
+        return "break"
+
+    def on_resize(self, event):
+        rowheight = ttk.Style().lookup("Treeview", "rowheight") or 20
+        # Leave room for the heading row.
+        self.pager.set_page_size((event.height - 25) // int(rowheight))
+        self.render()
 
     def on_row_double_click(self, event):
         selected_item = self.tree.selection()
         if selected_item:
-            item = self.tree.item(selected_item)
-            values = item['values']
-            case_id = values[0]
-            record = None
-            if os.path.exists(CSV_FILE):
-                with open(CSV_FILE, newline='', encoding="utf-8") as csvfile:
-                    reader = csv.DictReader(csvfile)
-                    for row in reader:
-                        if row.get("case_id") == case_id:
-                            record = row
-                            break
-            if record:
-                self.controller.frames[NewCaseFrame].load_case_data(record, previous_frame="ResultsFrame")
-                self.controller.show_frame(NewCaseFrame)
+            self.controller.open_case(selected_item[0], previous_frame="ResultsFrame")
 
 if __name__ == "__main__":
     app = LoggingApp()
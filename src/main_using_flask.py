@@ -1,12 +1,70 @@
-from flask import Flask, request, jsonify, render_template, redirect, url_for
+from flask import Flask, request, jsonify, render_template, redirect, url_for, Response, stream_with_context, g
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, insert, tuple_
+from collections import Counter
 from datetime import datetime
+from urllib.parse import urlencode
+import base64
+import click
+import csv
+import functools
+import io
+import json
+import os
+import sys
+import time
 import uuid
 
+from metrics import metrics, profile_report, timer
+from records import normalize_email, normalize_phone
+from response_cache import ResponseCache
+from storage import (CONTACT_COUNT_QUERIES, DB_FILE, NORMALIZED_COLUMNS, apply_pragmas, email_column_key,
+                     migrate_schema, phone_column_key, rebuild_contact_counts)
+
+# Configuration profiles, picked with CRM_PROFILE (default "development").
+PROFILES = {
+    'development': {
+        'DEBUG': True,
+    },
+    'production': {
+        'DEBUG': False,
+        # Per worker process: one connection per request thread, overflow for bursts,
+        # and a bounded wait for a free connection instead of queueing forever.
+        'SQLALCHEMY_ENGINE_OPTIONS': {'pool_size': 8, 'max_overflow': 8, 'pool_timeout': 10},
+    },
+}
+
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///crm.db'
+# The desktop app's database (CRM_DB), not one under Flask's instance folder.
+app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + DB_FILE
+app.config.from_mapping(PROFILES[os.environ.get('CRM_PROFILE', 'development')])
 db = SQLAlchemy(app)
 
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL, synchronous=NORMAL and busy_timeout, same as the desktop SQLite backend.
+    apply_pragmas(dbapi_connection)
+
+with app.app_context():
+    event.listen(db.engine, 'connect', set_sqlite_pragmas)
+
+# Rendered get_case and /api/cases bodies, dropped by the writes that change them.
+response_cache = ResponseCache()
+
+# /api/cases page sizes.
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 500
+CASE_FIELDS = ('case_id', 'phone_number', 'email', 'main_reaction', 'main_response', 'call_count', 'comments', 'timestamp')
+# Bulk import/export: rows per INSERT transaction, rejected rows echoed back, export fetch size.
+IMPORT_BATCH_SIZE = 5000
+IMPORT_MAX_ERRORS = 100
+EXPORT_FETCH_SIZE = 1000
+EXPORT_FIELDS = ('case_id', 'timestamp', 'phone_number', 'email', 'main_reaction', 'main_response', 'comments')
+# Import fields holding text; JSON numbers in them are taken as strings.
+IMPORT_TEXT_FIELDS = ('case_id', 'phone_number', 'email', 'main_reaction', 'main_response', 'comments')
+# /api/contacts/repeats defaults.
+REPEATS_LIMIT = 50
+REPEATS_MAX_LIMIT = 1000
+
 def create_case_id(length=8) -> str:
     return str(uuid.uuid4())[:length]
 
@@ -19,7 +77,85 @@ class Case(db.Model):
     main_response = db.Column(db.String(50), nullable=True)
     call_count = db.Column(db.Integer, default=0)
     comments = db.Column(db.Text, nullable=True)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    # Indexed for keyset pagination on (timestamp, id); SQLite appends the rowid to every index.
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    # Generated by SQLite (see storage.NORMALIZED_COLUMNS); filters and duplicate counts use these.
+    email_normalized = db.Column(db.String(100), db.Computed(NORMALIZED_COLUMNS['email_normalized']), index=True)
+    phone_normalized = db.Column(db.String(20), db.Computed(NORMALIZED_COLUMNS['phone_normalized']), index=True)
+
+class ContactCount(db.Model):
+    """Cases per normalized email/phone, maintained by triggers on the case table."""
+    __table_args__ = (db.Index('ix_contact_count_kind_count', 'kind', 'count'), {'sqlite_with_rowid': False})
+    kind = db.Column(db.String(5), primary_key=True)
+    value = db.Column(db.String(100), primary_key=True)
+    count = db.Column(db.Integer, nullable=False)
+
+def init_db():
+    """Create the tables, then add the contact columns, summary and triggers to older databases."""
+    db.create_all()
+    connection = db.engine.raw_connection()
+    try:
+        migrate_schema(connection.driver_connection)
+    finally:
+        connection.close()
+
+def contact_counts(email, phone):
+    """Number of cases sharing email and phone, read from the contact_count summary."""
+    keys = [('email', email_column_key(email)), ('phone', phone_column_key(phone))]
+    counts = {'email': 0, 'phone': 0}
+    rows = ContactCount.query.filter(tuple_(ContactCount.kind, ContactCount.value).in_(keys))
+    for row in rows:
+        counts[row.kind] = row.count
+    return counts['email'], counts['phone']
+
+def prefix_filter(column, prefix):
+    # A range rather than LIKE so SQLite can walk the column's index.
+    return db.and_(column >= prefix, column < prefix + '\U0010ffff')
+
+def contact_tags(email, phone):
+    # get_case bodies embed the contact's duplicate counts, so they depend on these.
+    return ('email', email_column_key(email)), ('phone', phone_column_key(phone))
+
+def cache_generation():
+    """crm.db's change counter (storage.GENERATION_SCHEMA), shared by every process writing to it."""
+    return db.session.execute(db.text('SELECT generation FROM case_generation')).scalar_one()
+
+def cached_response(entry):
+    """Serve a cached (body, etag) pair, or a 304 if the client's If-None-Match matches."""
+    body, etag = entry
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    return response.make_conditional(request)
+
+def case_to_dict(case, fields=CASE_FIELDS):
+    data = {field: getattr(case, field) for field in fields}
+    if data.get('timestamp') is not None:
+        data['timestamp'] = data['timestamp'].isoformat(sep=' ')
+    return data
+
+def stored_timestamp():
+    # The timestamp text as stored: the desktop app and bulk import write 'YYYY-MM-DD HH:MM:SS'
+    # and SQLAlchemy adds microseconds, so paging and date filters compare the text itself.
+    return db.type_coerce(Case.timestamp, db.String)
+
+def encode_cursor(timestamp, case_id):
+    raw = json.dumps([timestamp, case_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    timestamp, case_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    if timestamp is not None and not isinstance(timestamp, str):
+        raise ValueError('Invalid cursor timestamp')
+    return timestamp, int(case_id)
+
+def after_cursor(timestamp, case_id):
+    """Rows after (timestamp, case_id) in newest-first order; SQLite sorts NULL timestamps last."""
+    if timestamp is None:
+        return db.and_(Case.timestamp.is_(None), Case.id < case_id)
+    return db.or_(tuple_(stored_timestamp(), Case.id) < (timestamp, case_id), Case.timestamp.is_(None))
+
+def parse_date(value):
+    return datetime.fromisoformat(value) if value else None
 
 @app.route('/')
 def home():
@@ -27,23 +163,90 @@ def home():
 
 @app.route('/display_cases', methods=['GET'])
 def get_cases():
-    cases = Case.query.all()  # Fetch all cases from the database
-    return render_template('display_cases.html', cases=cases)  # Pass the cases to the template
+    # The page fetches its rows from /api/cases one page at a time.
+    return render_template('display_cases.html', page_size=API_PAGE_SIZE)
+
+@app.route('/api/cases', methods=['GET'])
+def list_cases():
+    """Newest-first page of cases, keyset-paginated on (timestamp, id).
+
+    Query parameters: limit, cursor (next_cursor of the previous page), email and
+    phone (prefixes), since/until (ISO dates, until exclusive) and fields
+    (comma-separated projection). Pages are cached until the next change to the cases.
+    """
+    key = 'cases?' + urlencode(sorted(request.args.items(multi=True)))
+    generation = cache_generation()
+    response_cache.sync(generation)
+    entry = response_cache.get(key)
+    if entry is not None:
+        return cached_response(entry)
+    try:
+        limit = max(1, min(request.args.get('limit', API_PAGE_SIZE, type=int), API_MAX_PAGE_SIZE))
+        fields = tuple(request.args['fields'].split(',')) if request.args.get('fields') else CASE_FIELDS
+        unknown = [field for field in fields if field not in CASE_FIELDS]
+        if unknown:
+            return jsonify({'error': f'Unknown fields: {", ".join(unknown)}'}), 400
+        since = parse_date(request.args.get('since'))
+        until = parse_date(request.args.get('until'))
+        cursor = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    except (ValueError, TypeError):
+        return jsonify({'error': 'Invalid limit, date or cursor'}), 400
+
+    query = Case.query.add_columns(stored_timestamp())
+    if request.args.get('email'):
+        query = query.filter(prefix_filter(Case.email_normalized, email_column_key(request.args['email'])))
+    if request.args.get('phone'):
+        query = query.filter(prefix_filter(Case.phone_normalized, phone_column_key(request.args['phone'])))
+    if since:
+        query = query.filter(stored_timestamp() >= since.isoformat(sep=' '))
+    if until:
+        query = query.filter(stored_timestamp() < until.isoformat(sep=' '))
+    if cursor:
+        query = query.filter(after_cursor(*cursor))
+    # One extra row tells us whether there is a next page.
+    cases = query.order_by(Case.timestamp.desc(), Case.id.desc()).limit(limit + 1)
+
+    def generate():
+        yield '{"cases": ['
+        last = None
+        for n, (case, timestamp) in enumerate(cases):
+            if n == limit:
+                break
+            yield (',' if n else '') + json.dumps(case_to_dict(case, fields))
+            last = timestamp, case.id
+            g.timing.rows = n + 1
+        more = last is not None and n == limit
+        yield '], "next_cursor": ' + json.dumps(encode_cursor(*last) if more else None) + '}'
+
+    # Pages are at most API_MAX_PAGE_SIZE rows, so the body is small enough to keep.
+    body = ''.join(generate()).encode()
+    return cached_response(response_cache.put(key, body, [('listing',)], generation))
 
 @app.route('/case/<case_id>', methods=['GET'])
 def get_case(case_id):
+    generation = cache_generation()
+    response_cache.sync(generation)
+    entry = response_cache.get(('case', case_id))
+    if entry is not None:
+        return cached_response(entry)
     case = Case.query.filter_by(case_id=case_id).first()
     if case:
-        return jsonify({
+        email_count, phone_count = contact_counts(case.email, case.phone_number)
+        body = jsonify({
             'case_id': case.case_id,
             'phone_number': case.phone_number,
             'email': case.email,
             'main_reaction': case.main_reaction,
             'main_response': case.main_response,
             'call_count': case.call_count,
+            'email_count': email_count,
+            'phone_count': phone_count,
             'comments': case.comments,
             'timestamp': case.timestamp
-        })
+        }).get_data()
+        g.timing.rows = 1
+        tags = [('case', case_id), *contact_tags(case.email, case.phone_number)]
+        return cached_response(response_cache.put(('case', case_id), body, tags, generation))
     return jsonify({'message': 'Case not found'}), 404
 
 # Route to display the form
@@ -81,7 +284,9 @@ def create_case():
 
         # Add to the database
         db.session.add(new_case)
-        db.session.commit()
+        with timer('db.commit'):
+            db.session.commit()
+        response_cache.invalidate(('listing',), *contact_tags(email, phone_number), generation=cache_generation())
 
         # Redirect to a confirmation page or back to the form
         return redirect(url_for('home'))
@@ -97,14 +302,316 @@ def delete_case_form():
 def delete_case(case_id):
     case = Case.query.filter_by(case_id=case_id).first()
     if case:
+        tags = contact_tags(case.email, case.phone_number)
         db.session.delete(case)
-        db.session.commit()
+        with timer('db.commit'):
+            db.session.commit()
+        response_cache.invalidate(('listing',), ('case', case_id), *tags, generation=cache_generation())
         return jsonify({'message': 'Case deleted successfully'})
     return jsonify({'message': 'Case not found'}), 404
 
+@app.route('/api/contacts/counts', methods=['GET'])
+def get_contact_counts():
+    """Cases sharing ?email= and ?phone=, the web side of the desktop's duplicate counts."""
+    email_count, phone_count = contact_counts(request.args.get('email'), request.args.get('phone'))
+    return jsonify({'email_count': email_count, 'phone_count': phone_count})
+
+@app.route('/api/contacts/repeats', methods=['GET'])
+def list_repeat_contacts():
+    """Contacts with at least min_count cases, most frequent first.
+
+    Query parameters: kind (email or phone), min_count (default 2), limit and
+    source: "summary" (default) reads contact_count, "aggregate" runs the
+    GROUP BY over the normalized column index instead.
+    """
+    kind = request.args.get('kind', 'email')
+    source = request.args.get('source', 'summary')
+    if kind not in CONTACT_COUNT_QUERIES or source not in ('summary', 'aggregate'):
+        return jsonify({'error': 'kind must be email or phone and source summary or aggregate'}), 400
+    try:
+        min_count = max(1, request.args.get('min_count', 2, type=int))
+        limit = max(1, min(request.args.get('limit', REPEATS_LIMIT, type=int), REPEATS_MAX_LIMIT))
+    except (ValueError, TypeError):
+        return jsonify({'error': 'Invalid min_count or limit'}), 400
+
+    if source == 'summary':
+        rows = db.session.execute(
+            db.select(ContactCount.value, ContactCount.count)
+            .where(ContactCount.kind == kind, ContactCount.count >= min_count)
+            .order_by(ContactCount.count.desc(), ContactCount.value)
+            .limit(limit)
+        )
+    else:
+        rows = db.session.execute(
+            db.text(f'SELECT * FROM ({CONTACT_COUNT_QUERIES[kind]}) WHERE count >= :min_count '
+                    'ORDER BY count DESC, value LIMIT :limit'),
+            {'min_count': min_count, 'limit': limit},
+        )
+    contacts = [{'value': value, 'count': count} for value, count in rows]
+    g.timing.rows = len(contacts)
+    return jsonify({'kind': kind, 'contacts': contacts})
+
+def read_import_rows(stream, fmt):
+    """Yield (line, dict) from an uploaded CSV (header row) or JSONL byte stream."""
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    if fmt == 'jsonl':
+        for line, raw in enumerate(text, 1):
+            if raw.strip():
+                try:
+                    yield line, json.loads(raw)
+                except ValueError:
+                    yield line, None
+    else:
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+
+def import_text(row, field):
+    """A text field of an import row as a string: JSON numbers are converted, other types rejected."""
+    value = row.get(field)
+    if value is None:
+        return ''
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        raise ValueError(f'{field} must be a string')
+    return str(value)
+
+def validate_import_row(row):
+    """Return (values, error) for one import row, with the same limits as create_case."""
+    if not isinstance(row, dict):
+        return None, 'Not a JSON object'
+    try:
+        text = {field: import_text(row, field) for field in IMPORT_TEXT_FIELDS}
+    except ValueError as e:
+        return None, str(e)
+    phone_number = text['phone_number'].strip()
+    email = text['email'].strip()
+    if not phone_number:
+        return None, 'Missing phone number'
+    if len(phone_number) > 50:
+        return None, 'Phone number exceeds maximum length of 50 characters'
+    if len(email) > 50:
+        return None, 'Email exceeds maximum length of 50 characters'
+    try:
+        timestamp = datetime.fromisoformat(row['timestamp']) if row.get('timestamp') else datetime.utcnow()
+    except (TypeError, ValueError):
+        return None, 'Invalid timestamp'
+    return {
+        'case_id': text['case_id'].strip() or create_case_id(),
+        'phone_number': phone_number,
+        'email': email,
+        'main_reaction': text['main_reaction'] or None,
+        'main_response': text['main_response'] or None,
+        'comments': text['comments'] or None,
+        'timestamp': timestamp,
+    }, None
+
+def import_cases(rows, batch_size=IMPORT_BATCH_SIZE):
+    """Validate and insert (line, row) pairs as they stream in, one transaction per batch.
+
+    Rows whose case_id already exists are skipped. Repeat emails/phones within the
+    import are counted in the same pass. Returns a summary including rows/sec.
+    """
+    start = time.perf_counter()
+    # OR IGNORE skips case_ids that already exist instead of failing the whole batch.
+    statement = insert(Case.__table__).prefix_with('OR IGNORE')
+    email_counts, phone_counts = Counter(), Counter()
+    errors, batch = [], []
+    read = rejected = inserted = 0
+
+    def flush():
+        with timer('import_cases.batch') as timing:
+            result = db.session.connection().execute(statement, batch)
+            db.session.commit()
+            timing.rows = len(batch)
+        batch.clear()
+        return result.rowcount
+
+    for line, row in rows:
+        read += 1
+        values, error = validate_import_row(row)
+        if error:
+            rejected += 1
+            if len(errors) < IMPORT_MAX_ERRORS:
+                errors.append({'line': line, 'error': error})
+            continue
+        if values['email']:
+            email_counts[normalize_email(values['email'])] += 1
+        phone_counts[normalize_phone(values['phone_number'])] += 1
+        batch.append(values)
+        if len(batch) >= batch_size:
+            inserted += flush()
+    if batch:
+        inserted += flush()
+    seconds = time.perf_counter() - start
+    return {
+        'read': read,
+        'inserted': inserted,
+        'skipped_existing': read - rejected - inserted,
+        'rejected': rejected,
+        'errors': errors,
+        'repeat_emails': sum(1 for count in email_counts.values() if count > 1),
+        'repeat_phones': sum(1 for count in phone_counts.values() if count > 1),
+        'seconds': round(seconds, 3),
+        'rows_per_sec': round(read / seconds) if seconds else read,
+    }
+
+def export_cases(fmt, stats=None):
+    """Yield every case as CSV or JSONL text chunks, fetching EXPORT_FETCH_SIZE rows at a time.
+
+    If given, stats['rows'] is set to the number of exported cases once done.
+    """
+    with timer('export_cases') as timing:
+        timing.rows = 0
+        cases = db.session.execute(
+            db.select(*(getattr(Case, field) for field in EXPORT_FIELDS))
+            .order_by(Case.id)
+            .execution_options(yield_per=EXPORT_FETCH_SIZE)
+        )
+        if fmt == 'jsonl':
+            for values in cases:
+                data = dict(zip(EXPORT_FIELDS, values))
+                if data['timestamp'] is not None:
+                    data['timestamp'] = data['timestamp'].isoformat(sep=' ')
+                timing.rows += 1
+                yield json.dumps(data) + '\n'
+        else:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(EXPORT_FIELDS)
+            for values in cases:
+                writer.writerow(values)
+                timing.rows += 1
+                if timing.rows % EXPORT_FETCH_SIZE == 0:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+            yield buffer.getvalue()
+    if stats is not None:
+        stats['rows'] = timing.rows
+
+def import_format(filename, requested=None):
+    if requested:
+        return requested
+    return 'jsonl' if filename and filename.lower().endswith(('.jsonl', '.ndjson')) else 'csv'
+
+@app.route('/api/cases/import', methods=['POST'])
+def bulk_import_cases():
+    """Bulk import an uploaded CSV or JSONL file (multipart field "file")."""
+    upload = request.files.get('file')
+    if upload is None:
+        return jsonify({'error': 'No file uploaded'}), 400
+    fmt = import_format(upload.filename, request.args.get('format'))
+    if fmt not in ('csv', 'jsonl'):
+        return jsonify({'error': 'Format must be csv or jsonl'}), 400
+    summary = import_cases(read_import_rows(upload.stream, fmt))
+    g.timing.rows = summary['read']
+    if summary['inserted']:
+        response_cache.clear()
+    return jsonify(summary)
+
+@app.route('/api/cases/export', methods=['GET'])
+def bulk_export_cases():
+    """Stream every case as CSV (default) or JSONL (?format=jsonl)."""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'jsonl'):
+        return jsonify({'error': 'Format must be csv or jsonl'}), 400
+    mimetype = 'application/x-ndjson' if fmt == 'jsonl' else 'text/csv'
+    return Response(stream_with_context(export_cases(fmt)), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename=cases.{fmt}'})
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Per-route latency histograms and row counts of this worker process.
+
+    Prometheus text by default, or ?format=json for the p50/p90/p99 summary.
+    """
+    if request.args.get('format') == 'json':
+        return jsonify({
+            'operations': metrics.snapshot(),
+            'profiling': metrics.profiling,
+            'cache': {'entries': len(response_cache), 'bytes': response_cache.size,
+                      'hits': response_cache.hits, 'misses': response_cache.misses},
+        })
+    text = metrics.render_text() + ''.join(
+        f'crm_response_cache_{name} {value}\n' for name, value in (
+            ('entries', len(response_cache)), ('bytes', response_cache.size),
+            ('hits_total', response_cache.hits), ('misses_total', response_cache.misses)))
+    return Response(text, mimetype='text/plain; version=0.0.4')
+
+@app.route('/metrics/profile', methods=['POST'])
+def toggle_profiling():
+    """?action=start profiles every request under cProfile; ?action=stop returns the top functions."""
+    action = request.args.get('action')
+    if action == 'start':
+        metrics.start_profiling()
+        return jsonify({'profiling': True})
+    if action == 'stop':
+        return Response(profile_report(metrics.stop_profiling()), mimetype='text/plain')
+    return jsonify({'error': 'action must be start or stop'}), 400
+
+def timed_route(endpoint, view):
+    """Record the view's latency as route.<endpoint>; views may set g.timing.rows."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        with timer(f'route.{endpoint}') as timing:
+            g.timing = timing
+            return view(*args, **kwargs)
+    return wrapper
+
+# Every route defined above is timed (static files and the metrics routes themselves excepted).
+for endpoint, view in list(app.view_functions.items()):
+    if endpoint not in ('static', 'get_metrics', 'toggle_profiling'):
+        app.view_functions[endpoint] = timed_route(endpoint, view)
+
+@app.cli.command('import-cases')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), default=None)
+@click.option('--batch-size', default=IMPORT_BATCH_SIZE, show_default=True)
+def import_cases_command(path, fmt, batch_size):
+    """Bulk import cases from a CSV or JSONL file."""
+    init_db()
+    with open(path, 'rb') as f:
+        summary = import_cases(read_import_rows(f, import_format(path, fmt)), batch_size)
+    for error in summary['errors']:
+        click.echo(f"line {error['line']}: {error['error']}", err=True)
+    click.echo(f"Read {summary['read']} rows: {summary['inserted']} inserted, "
+               f"{summary['skipped_existing']} already present, {summary['rejected']} rejected "
+               f"in {summary['seconds']}s ({summary['rows_per_sec']} rows/sec); "
+               f"{summary['repeat_emails']} repeat emails, {summary['repeat_phones']} repeat phones")
+
+@app.cli.command('export-cases')
+@click.argument('path', type=click.Path(dir_okay=False), default='-')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), default='csv')
+def export_cases_command(path, fmt):
+    """Stream every case to a CSV or JSONL file (default: stdout)."""
+    start = time.perf_counter()
+    out = sys.stdout if path == '-' else open(path, 'w', encoding='utf-8', newline='')
+    stats = {}
+    try:
+        for chunk in export_cases(fmt, stats):
+            out.write(chunk)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    seconds = time.perf_counter() - start
+    rows = stats.get('rows', 0)
+    click.echo(f"Exported {rows} rows in {seconds:.2f}s ({rows / seconds if seconds else rows:.0f} rows/sec)", err=True)
+
+@app.cli.command('rebuild-contact-counts')
+def rebuild_contact_counts_command():
+    """Recompute the contact_count summary from GROUP BY aggregates."""
+    init_db()
+    connection = db.engine.raw_connection()
+    try:
+        rebuild_contact_counts(connection.driver_connection)
+        connection.commit()
+    finally:
+        connection.close()
+    click.echo(f'Rebuilt counts for {ContactCount.query.count()} contacts')
+
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
-    app.run(debug=True)
+        init_db()
+    app.run(debug=app.config['DEBUG'])
 
 
@@ -0,0 +1,214 @@
+import cProfile
+import functools
+import io
+import pstats
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Latency histogram bucket upper bounds in milliseconds; slower calls land in a final +Inf bucket.
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+# Functions listed by profile_report().
+PROFILE_LINES = 30
+
+
+class Histogram:
+    """Fixed-bucket latency histogram of one operation, plus the rows it handled."""
+
+    __slots__ = ("buckets", "count", "errors", "total", "max", "rows")
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.count = self.errors = self.rows = 0
+        self.total = self.max = 0.0
+
+    def observe(self, seconds, rows=None, error=False):
+        ms = seconds * 1000
+        self.buckets[bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+        if rows is not None:
+            self.rows += rows
+        if error:
+            self.errors += 1
+
+    def quantile(self, q):
+        """Upper bound (ms) of the bucket holding the q-th quantile; the max for the last bucket."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS_MS, self.buckets):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "rows": self.rows,
+            "mean_ms": self.total / self.count if self.count else 0.0,
+            "p50_ms": self.quantile(0.5),
+            "p90_ms": self.quantile(0.9),
+            "p99_ms": self.quantile(0.99),
+            "max_ms": self.max,
+        }
+
+
+class Timing:
+    """Yielded by Metrics.timer(); set rows to record how many rows the operation handled."""
+
+    __slots__ = ("rows",)
+
+    def __init__(self):
+        self.rows = None
+
+
+class Metrics:
+    """Process-wide registry of per-operation latency histograms.
+
+    Wrap work in ``with metrics.timer("name") as t: ...; t.rows = n`` or decorate it
+    with ``@metrics.timed("name")``. While profiling is on, each outermost timed
+    block also runs under cProfile, unless another one already is (Python 3.12+
+    allows only one profiler at a time), and its stats are merged for profile_report().
+    """
+
+    def __init__(self):
+        self.histograms = {}  # name -> Histogram
+        self.lock = threading.Lock()
+        self.profiling = False
+        self.stats = None  # pstats.Stats merged from the profiled blocks
+        self.profiler_busy = False  # a block is running under cProfile
+        self.local = threading.local()
+
+    def observe(self, name, seconds, rows=None, error=False):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds, rows, error)
+
+    @contextmanager
+    def timer(self, name):
+        timing = Timing()
+        # Only an outermost block profiles, and only one in the whole process at a time.
+        depth = getattr(self.local, "depth", 0)
+        profile = self._claim_profiler() if self.profiling and not depth else None
+        self.local.depth = depth + 1
+        error = False
+        start = time.perf_counter()
+        try:
+            if profile is not None:
+                profile.enable()
+            yield timing
+        except BaseException:
+            error = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            if profile is not None:
+                profile.disable()
+                self._merge(profile)
+            self.local.depth = depth
+            self.observe(name, elapsed, timing.rows, error)
+
+    def timed(self, name=None, rows=None):
+        """Decorator form of timer(); rows(result) returns the row count to record."""
+        def decorate(fn):
+            label = name or fn.__name__
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.timer(label) as timing:
+                    result = fn(*args, **kwargs)
+                    if rows is not None:
+                        timing.rows = rows(result)
+                    return result
+            return wrapper
+        return decorate
+
+    def start_profiling(self):
+        with self.lock:
+            self.profiling = True
+            self.stats = None
+
+    def stop_profiling(self):
+        """Stop profiling and return the merged pstats.Stats (None if nothing ran)."""
+        with self.lock:
+            self.profiling = False
+            stats, self.stats = self.stats, None
+        return stats
+
+    def _claim_profiler(self):
+        with self.lock:
+            if not self.profiling or self.profiler_busy:
+                return None
+            self.profiler_busy = True
+        return cProfile.Profile()
+
+    def _merge(self, profile):
+        """Add a finished block's stats and free the profiler for the next block."""
+        with self.lock:
+            self.profiler_busy = False
+            if not profile.getstats():
+                return
+            if self.stats is None:
+                self.stats = pstats.Stats(profile)
+            else:
+                self.stats.add(profile)
+
+    def snapshot(self):
+        """name -> count/errors/rows/mean/p50/p90/p99/max, for every operation seen so far."""
+        with self.lock:
+            return {name: histogram.snapshot() for name, histogram in sorted(self.histograms.items())}
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+
+    def render_text(self, prefix="crm"):
+        """Prometheus text exposition of every histogram (seconds, cumulative buckets)."""
+        lines = [f"# TYPE {prefix}_operation_seconds histogram"]
+        with self.lock:
+            for name, histogram in sorted(self.histograms.items()):
+                label = f'operation="{name}"'
+                cumulative = 0
+                for bound, n in zip(BUCKETS_MS + (None,), histogram.buckets):
+                    cumulative += n
+                    le = "+Inf" if bound is None else repr(bound / 1000)
+                    lines.append(f'{prefix}_operation_seconds_bucket{{{label},le="{le}"}} {cumulative}')
+                lines.append(f"{prefix}_operation_seconds_sum{{{label}}} {histogram.total / 1000}")
+                lines.append(f"{prefix}_operation_seconds_count{{{label}}} {histogram.count}")
+                lines.append(f"{prefix}_operation_errors_total{{{label}}} {histogram.errors}")
+                lines.append(f"{prefix}_operation_rows_total{{{label}}} {histogram.rows}")
+        return "\n".join(lines) + "\n"
+
+    def status_line(self, names):
+        """One-line "name p50/p99" summary of the given operations, skipping unseen ones."""
+        with self.lock:
+            parts = []
+            for name in names:
+                histogram = self.histograms.get(name)
+                if histogram is not None and histogram.count:
+                    parts.append(f"{name} {histogram.quantile(0.5):.1f}/{histogram.quantile(0.99):.1f} ms")
+        return "  ".join(parts)
+
+
+def profile_report(stats, limit=PROFILE_LINES):
+    """Top functions of a pstats.Stats by cumulative time, as text."""
+    if stats is None:
+        return "No profiled operations.\n"
+    out = io.StringIO()
+    stats.stream = out
+    stats.sort_stats("cumulative").print_stats(limit)
+    return out.getvalue()
+
+
+# Shared by every module in the process.
+metrics = Metrics()
+timer = metrics.timer
+timed = metrics.timed
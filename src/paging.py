@@ -0,0 +1,59 @@
+class ResultPager:
+    """Windowed view over a list of result case_ids.
+
+    Only the rows in the visible window (plus a small buffer) are fetched, so
+    the cost of showing a result set does not depend on its size.
+    """
+
+    def __init__(self, fetch, page_size=25, buffer=5):
+        self.fetch = fetch  # case_id -> row dict (or None if it was deleted)
+        self.page_size = page_size
+        self.buffer = buffer
+        self.ids = []
+        self.offset = 0
+
+    def reset(self, ids):
+        self.ids = ids
+        self.offset = 0
+
+    @property
+    def total(self):
+        return len(self.ids)
+
+    def set_page_size(self, page_size):
+        self.page_size = max(1, page_size)
+        self._clamp()
+
+    def scroll_to(self, fraction):
+        self.offset = int(fraction * self.total)
+        self._clamp()
+
+    def scroll_by(self, rows):
+        self.offset += rows
+        self._clamp()
+
+    def visible_ids(self):
+        """The case_ids of the visible rows and buffer."""
+        return self.ids[self.offset:self.offset + self.page_size + self.buffer]
+
+    def window(self, ids=None):
+        """Return (case_id, row) pairs for ids, by default the visible rows and buffer.
+
+        fetch may wait on the store, so the Tk thread takes visible_ids() itself
+        and leaves this to a worker.
+        """
+        pairs = []
+        for case_id in self.visible_ids() if ids is None else ids:
+            row = self.fetch(case_id)
+            if row is not None:
+                pairs.append((case_id, row))
+        return pairs
+
+    def fractions(self):
+        """First/last visible fractions, as a scrollbar's set() expects them."""
+        if not self.total:
+            return 0.0, 1.0
+        return self.offset / self.total, min(1.0, (self.offset + self.page_size) / self.total)
+
+    def _clamp(self):
+        self.offset = max(0, min(self.offset, self.total - self.page_size))
@@ -0,0 +1,86 @@
+import functools
+import re
+import sys
+
+# Persisted fields of a case; email_count/phone_count are derived by the store.
+RECORD_FIELDS = ("case_id", "timestamp", "phone_number", "email", "main_reaction", "main_response", "comments")
+# Fields with few distinct values (or repeated across duplicate contacts) share one string object.
+INTERNED_FIELDS = ("phone_number", "email", "main_reaction", "main_response")
+# Calling code of local numbers: "+30 69...", "0030 69..." and "69..." are one contact.
+COUNTRY_CODE = "30"
+# Digits in a local number, to recognise one typed with its country code but no "+".
+NATIONAL_DIGITS = 10
+# Email domains that deliver to another's mailboxes, and those that ignore dots in the local part.
+EMAIL_DOMAIN_ALIASES = {"googlemail.com": "gmail.com"}
+DOTLESS_EMAIL_DOMAINS = {"gmail.com"}
+# Distinct contacts whose canonical form is remembered; repeat contacts are common.
+NORMALIZE_CACHE = 1 << 16
+NON_DIGITS = re.compile(r"[^0-9]")
+
+
+@functools.lru_cache(maxsize=NORMALIZE_CACHE)
+def normalize_email(email):
+    """Canonical mailbox: lowercased, "+tag" dropped, domain aliases merged, gmail dots removed."""
+    email = (email or "").strip().lower()
+    local, at, domain = email.rpartition("@")
+    if not at or not local:
+        return email
+    domain = domain.rstrip(".")
+    domain = EMAIL_DOMAIN_ALIASES.get(domain, domain)
+    local = local.split("+", 1)[0] or local
+    if domain in DOTLESS_EMAIL_DOMAINS:
+        local = local.replace(".", "") or local
+    return f"{local}@{domain}"
+
+
+@functools.lru_cache(maxsize=NORMALIZE_CACHE)
+def normalize_phone(phone):
+    """Canonical number: its digits, local numbers without their country code, others as "+<digits>"."""
+    phone = (phone or "").strip()
+    digits = NON_DIGITS.sub("", phone)
+    if phone.startswith("+"):
+        pass
+    elif digits.startswith("00"):
+        digits = digits[2:]
+    elif not (len(digits) == len(COUNTRY_CODE) + NATIONAL_DIGITS and digits.startswith(COUNTRY_CODE)):
+        return digits
+    if digits.startswith(COUNTRY_CODE):
+        return digits[len(COUNTRY_CODE):]
+    return "+" + digits if digits else ""
+
+
+class CaseRecord:
+    """One case held in __slots__ rather than a nine-key dict per row.
+
+    Supports the read-only parts of the dict API the frames use (get, [], to_dict).
+    """
+
+    __slots__ = RECORD_FIELDS
+
+    def __init__(self, case_id="", timestamp="", phone_number="", email="",
+                 main_reaction="", main_response="", comments=""):
+        self.case_id = case_id
+        self.timestamp = timestamp
+        self.phone_number = sys.intern(phone_number)
+        self.email = sys.intern(email)
+        self.main_reaction = sys.intern(main_reaction)
+        self.main_response = sys.intern(main_response)
+        self.comments = comments
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{field: data.get(field) or "" for field in RECORD_FIELDS})
+
+    def get(self, field, default=""):
+        return getattr(self, field) if field in RECORD_FIELDS else default
+
+    def __getitem__(self, field):
+        if field not in RECORD_FIELDS:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in RECORD_FIELDS}
+
+    def __repr__(self):
+        return f"CaseRecord({self.to_dict()!r})"
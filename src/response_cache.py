@@ -0,0 +1,116 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+# Defaults: entries kept, total body bytes kept, seconds an entry stays fresh.
+MAX_ENTRIES = 2048
+MAX_BYTES = 32 << 20
+TTL = 10.0
+
+
+class ResponseCache:
+    """In-process LRU cache of rendered response bodies with a TTL and a size bound.
+
+    Each entry carries tags (e.g. ("case", case_id) or ("email", address)) so a
+    write can drop exactly the entries it affects. Writes by other processes
+    are caught with the database's change counter (generation): sync() before
+    serving drops everything once it has moved, and an entry rendered at an
+    older generation is not stored. Without generations, other processes'
+    writes are only noticed once the TTL expires.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES, ttl=TTL, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()  # key -> (expires, body, etag, tags)
+        self.tagged = {}  # tag -> set of keys
+        self.size = 0
+        self.hits = self.misses = 0
+        self.generation = None  # database change counter the entries are current for
+        self.lock = threading.Lock()
+
+    def sync(self, generation):
+        """Drop every entry if the database changed (in any process) since the last sync."""
+        with self.lock:
+            if generation != self.generation:
+                self._clear()
+                self.generation = generation
+
+    def get(self, key):
+        """Return (body, etag) for a fresh entry, or None."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] <= self.clock():
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry[1], entry[2]
+
+    def put(self, key, body, tags=(), generation=None):
+        """Store body (bytes) under key and return (body, etag).
+
+        Oversized bodies, and bodies rendered at a generation the cache has
+        moved past, are not kept.
+        """
+        etag = hashlib.blake2b(body, digest_size=12).hexdigest()
+        if len(body) > self.max_bytes:
+            return body, etag
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return body, etag
+            if key in self.entries:
+                self._drop(key)
+            self.entries[key] = (self.clock() + self.ttl, body, etag, tuple(tags))
+            self.size += len(body)
+            for tag in tags:
+                self.tagged.setdefault(tag, set()).add(key)
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                self._drop(next(iter(self.entries)))
+        return body, etag
+
+    def invalidate(self, *tags, generation=None):
+        """Drop every entry carrying any of tags.
+
+        generation is the change counter right after the one write that made
+        them stale. If it moved by more than that write, other writes happened
+        too and every entry is dropped.
+        """
+        with self.lock:
+            if generation is not None:
+                stale = self.generation is None or generation != self.generation + 1
+                self.generation = generation
+                if stale:
+                    self._clear()
+                    return
+            for tag in tags:
+                for key in list(self.tagged.get(tag, ())):
+                    self._drop(key)
+
+    def clear(self):
+        with self.lock:
+            self._clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _clear(self):
+        self.entries.clear()
+        self.tagged.clear()
+        self.size = 0
+
+    def _drop(self, key):
+        _, body, _, tags = self.entries.pop(key)
+        self.size -= len(body)
+        for tag in tags:
+            keys = self.tagged.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tagged[tag]
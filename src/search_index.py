@@ -0,0 +1,270 @@
+import fnmatch  # For wildcard matching
+from array import array
+from bisect import bisect_left
+
+# Fields the search box matches against.
+SEARCH_FIELDS = ("case_id", "phone_number", "email")
+FIELD_COUNT = len(SEARCH_FIELDS)
+WILDCARDS = "*?["
+# Candidates verified between cancellation checks.
+CHECK_EVERY = 4096
+# Typecode of the row-number arrays (4 bytes per entry).
+ROW_TYPE = "I"
+# Intersect a posting by binary search, not a scan, once it is this many times the candidates.
+PROBE_RATIO = 32
+EMPTY = array(ROW_TYPE)
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class SearchIndex:
+    """Wildcard search over case_id, phone and email without scanning every row.
+
+    Each indexed case gets a row number, a new one whenever it is re-added, so
+    row order is store order. Everything else holds row numbers in 4-byte
+    arrays rather than case_id strings:
+
+    - ``69*``: prefix range in ``forward``, sorted by value.
+    - ``*@gmail.com``: prefix range in ``backward``, sorted by reversed value.
+    - ``*mail*`` and plain substrings: intersection of sorted trigram postings.
+    An entry of forward/backward is row * FIELD_COUNT + field. Other fnmatch
+    patterns narrow with the longest usable literal and verify the candidates
+    with fnmatch. Values are lowercased, like the queries. The rows of removed
+    or re-added cases stay behind as None until the next build().
+    """
+
+    def __init__(self):
+        self.ids = []       # row -> case_id, None once removed
+        self.rows = {}      # case_id -> current row
+        self.columns = tuple([] for _ in SEARCH_FIELDS)  # per field: row -> lowercased value
+        self.forward = array(ROW_TYPE)   # entries sorted by value
+        self.backward = array(ROW_TYPE)  # entries sorted by reversed value
+        self.postings = {}  # trigram -> sorted array of rows
+        self.short = array(ROW_TYPE)  # sorted rows with a value too short to have trigrams
+
+    def build(self, rows):
+        """Index every row at once, sorting the arrays a single time."""
+        self.__init__()
+        for row in rows:
+            self._add(row, bulk=True)
+        self._sort()
+
+    def add(self, row):
+        self._add(row, bulk=False)
+
+    def extend(self, rows):
+        """Index many new rows (e.g. an archive being loaded), re-sorting the arrays once."""
+        rows = list(rows)
+        for row in rows:
+            self.remove(row.get("case_id", ""))
+        for row in rows:
+            self._add(row, bulk=True)
+        self._sort()
+
+    def remove(self, case_id):
+        row = self.rows.pop(case_id, None)
+        if row is None:
+            return
+        grams = set()
+        short = False
+        for field, column in enumerate(self.columns):
+            value = column[row]
+            if value:
+                entry = row * FIELD_COUNT + field
+                for entries, backward in ((self.forward, False), (self.backward, True)):
+                    i = self._bound(entries, self._key(entry, backward), backward)
+                    while entries[i] != entry:
+                        i += 1
+                    del entries[i]
+                grams |= trigrams(value)
+                short = short or len(value) < 3
+        for gram in grams:
+            rows = self.postings[gram]
+            _discard(rows, row)
+            if not rows:
+                del self.postings[gram]
+        if short:
+            _discard(self.short, row)
+        self.ids[row] = None
+        for column in self.columns:
+            column[row] = None
+
+    def search(self, query, check=None):
+        """Return the case_ids matching query (already lowercased), in store order.
+
+        As in the search box, only a "*" makes the query an fnmatch pattern.
+        check() is called periodically during long scans and may raise to abort.
+        """
+        if "*" not in query:
+            rows = self._contains(query, check)
+        else:
+            rows = self._match(query, check)
+        return [self.ids[row] for row in sorted(rows)]
+
+    def filter(self, case_ids, query, check=None):
+        """Keep the case_ids (in their order) that match query; used to narrow earlier results."""
+        if "*" not in query:
+            predicate = lambda value: query in value
+        else:
+            predicate = lambda value: fnmatch.fnmatchcase(value, query)
+        ids = []
+        for n, case_id in enumerate(case_ids):
+            if check is not None and n % CHECK_EVERY == 0:
+                check()
+            row = self.rows.get(case_id)
+            if row is not None and any(predicate(column[row]) for column in self.columns):
+                ids.append(case_id)
+        return ids
+
+    def _add(self, row, bulk):
+        case_id = row.get("case_id", "")
+        if case_id in self.rows:
+            self.remove(case_id)
+        number = len(self.ids)
+        self.ids.append(case_id)
+        self.rows[case_id] = number
+        grams = set()
+        short = False
+        for field, column in enumerate(self.columns):
+            value = _lower(row.get(SEARCH_FIELDS[field], ""))
+            column.append(value)
+            if not value:
+                continue
+            entry = number * FIELD_COUNT + field
+            if bulk:
+                self.forward.append(entry)
+                self.backward.append(entry)
+            else:
+                self.forward.insert(self._bound(self.forward, value, False), entry)
+                self.backward.insert(self._bound(self.backward, value[::-1], True), entry)
+            grams |= trigrams(value)
+            short = short or len(value) < 3
+        # The new row is the highest yet, so appending keeps every posting sorted.
+        if short:
+            self.short.append(number)
+        for gram in grams:
+            rows = self.postings.get(gram)
+            if rows is None:
+                rows = self.postings[gram] = array(ROW_TYPE)
+            rows.append(number)
+
+    def _sort(self):
+        self.forward = array(ROW_TYPE, sorted(self.forward, key=lambda entry: self._key(entry, False)))
+        self.backward = array(ROW_TYPE, sorted(self.backward, key=lambda entry: self._key(entry, True)))
+
+    def _key(self, entry, backward):
+        value = self.columns[entry % FIELD_COUNT][entry // FIELD_COUNT]
+        return value[::-1] if backward else value
+
+    def _bound(self, entries, key, backward):
+        """First position in entries (forward or backward) whose key is not below key."""
+        lo, hi = 0, len(entries)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(entries[mid], backward) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _prefix(self, entries, prefix, backward):
+        rows = set()
+        i = self._bound(entries, prefix, backward)
+        while i < len(entries) and self._key(entries[i], backward).startswith(prefix):
+            rows.add(entries[i] // FIELD_COUNT)
+            i += 1
+        return rows
+
+    def _contains(self, literal, check=None):
+        """Rows with a field containing literal."""
+        if not literal:
+            return set(self.rows.values())
+        if len(literal) >= 3:
+            postings = sorted((self.postings.get(gram, EMPTY) for gram in trigrams(literal)), key=len)
+            candidates = set(postings[0])
+            for rows in postings[1:]:
+                if len(rows) > PROBE_RATIO * len(candidates):
+                    candidates = {row for row in candidates if _holds(rows, row)}
+                else:
+                    candidates.intersection_update(rows)
+        else:
+            # Too short for trigrams: any gram containing it, plus the short values.
+            candidates = set(self.short)
+            for gram, rows in self.postings.items():
+                if literal in gram:
+                    candidates.update(rows)
+        return self._verify(candidates, lambda value: literal in value, check)
+
+    def _match(self, pattern, check=None):
+        body = pattern.strip("*")
+        if not any(c in body for c in WILDCARDS):
+            # The common shapes: "lit*", "*lit" and "*lit*".
+            starts, ends = pattern.startswith("*"), pattern.endswith("*")
+            if starts and ends:
+                return self._contains(body, check)
+            if ends:
+                return self._prefix(self.forward, body, False)
+            return self._prefix(self.backward, body[::-1], True)
+        # General pattern: narrow with a literal, then verify with fnmatch.
+        head = _literal_head(pattern)
+        if head:
+            candidates = self._prefix(self.forward, head, False)
+        else:
+            fragment = max(_literals(pattern), key=len, default="")
+            candidates = self._contains(fragment, check) if len(fragment) >= 3 else set(self.rows.values())
+        return self._verify(candidates, lambda value: fnmatch.fnmatchcase(value, pattern), check)
+
+    def _verify(self, candidates, predicate, check):
+        rows = set()
+        for n, row in enumerate(candidates):
+            if check is not None and n % CHECK_EVERY == 0:
+                check()
+            if any(predicate(column[row]) for column in self.columns):
+                rows.add(row)
+        return rows
+
+
+def _lower(value):
+    # Already lowercase values (most phones, case_ids and emails) keep the row's own string.
+    lowered = value.lower()
+    return value if lowered == value else lowered
+
+
+def _holds(rows, row):
+    i = bisect_left(rows, row)
+    return i < len(rows) and rows[i] == row
+
+
+def _discard(rows, row):
+    i = bisect_left(rows, row)
+    if i < len(rows) and rows[i] == row:
+        del rows[i]
+
+
+def _literal_head(pattern):
+    for i, c in enumerate(pattern):
+        if c in WILDCARDS:
+            return pattern[:i]
+    return pattern
+
+
+def _literals(pattern):
+    """Literal runs between wildcards (character classes are skipped)."""
+    runs, current, i = [], "", 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c in "*?":
+            runs.append(current)
+            current = ""
+        elif c == "[":
+            runs.append(current)
+            current = ""
+            end = pattern.find("]", i + 2)
+            i = end if end != -1 else len(pattern)
+        else:
+            current += c
+        i += 1
+    runs.append(current)
+    return runs
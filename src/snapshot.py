@@ -0,0 +1,304 @@
+import functools
+import mmap
+import os
+import re
+import struct
+import threading
+from array import array
+from bisect import bisect_right
+
+from records import RECORD_FIELDS, CaseRecord, normalize_email, normalize_phone
+from search_index import SEARCH_FIELDS
+
+MAGIC = b"CRMSNAP2"
+# magic, row count, column count, source CSV size and mtime (ns).
+HEADER = struct.Struct("<8sIIQQ")
+# Per column: name, offsets position, heap position, heap length.
+COLUMN = struct.Struct("<32sQQQ")
+# Lowercased copies of the searched fields, as SearchIndex holds them.
+SEARCH_COLUMNS = tuple("search." + field for field in SEARCH_FIELDS)
+# Canonical contact keys the duplicate counts group on.
+KEY_FIELDS = {"email": normalize_email, "phone_number": normalize_phone}
+# Row numbers sorted by case_id, for get() by binary search.
+ID_ORDER = "order.case_id"
+# One UTF-8 character, never crossing the separator between values.
+ANY_CHAR = rb"(?:[^\n\x80-\xbf][\x80-\xbf]*)"
+
+
+def search_value(value):
+    return (value or "").lower().replace("\n", " ")
+
+
+def contact_key(field, value):
+    return KEY_FIELDS[field](value).replace("\n", " ")
+
+
+class SnapshotWriter:
+    """Builds a snapshot while the CSV is being compacted, one row at a time."""
+
+    def __init__(self):
+        names = RECORD_FIELDS + SEARCH_COLUMNS + tuple("key." + field for field in KEY_FIELDS)
+        self.columns = {name: (array("Q", [1]), bytearray(b"\n")) for name in names}
+        self.case_ids = []
+
+    def add(self, row):
+        for field in RECORD_FIELDS:
+            self._append(field, row.get(field) or "")
+        for field, name in zip(SEARCH_FIELDS, SEARCH_COLUMNS):
+            self._append(name, search_value(row.get(field)))
+        for field in KEY_FIELDS:
+            self._append("key." + field, contact_key(field, row.get(field)))
+        self.case_ids.append(row.get("case_id") or "")
+
+    def _append(self, name, value):
+        offsets, heap = self.columns[name]
+        heap += value.encode("utf-8")
+        heap += b"\n"
+        offsets.append(len(heap))
+
+    def write(self, path, source):
+        """Write the snapshot atomically, stamped with the os.stat() of the CSV it mirrors."""
+        rows = len(self.case_ids)
+        order = array("Q", sorted(range(rows), key=self.case_ids.__getitem__))
+        columns = list(self.columns.items()) + [(ID_ORDER, (order, bytearray()))]
+        position = _align(HEADER.size + COLUMN.size * len(columns))
+        layout = []
+        for name, (offsets, heap) in columns:
+            heap_position = _align(position + offsets.itemsize * len(offsets))
+            layout.append((name, position, heap_position, heap))
+            position = _align(heap_position + len(heap))
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, rows, len(columns), source.st_size, source.st_mtime_ns))
+            for name, offsets_position, heap_position, heap in layout:
+                f.write(COLUMN.pack(name.encode(), offsets_position, heap_position, len(heap)))
+            for (name, (offsets, heap)), (_, offsets_position, heap_position, _) in zip(columns, layout):
+                f.seek(offsets_position)
+                f.write(offsets.tobytes())
+                f.seek(heap_position)
+                f.write(heap)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+
+def _reading(method):
+    """Run method under the snapshot's lock, or hand the call to its successor once closed."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            if self.mm is not None:
+                return method(self, *args, **kwargs)
+        if self.successor is None:
+            raise ValueError("snapshot is closed")
+        return getattr(self.successor, method.__name__)(*args, **kwargs)
+    return wrapper
+
+
+class CaseSnapshot:
+    """Read-only, memory-mapped columnar copy of the cases as of the last compaction.
+
+    Each field is an offsets table plus a heap of newline-separated UTF-8 values,
+    so the row count is in the header, searches and counts scan a column's heap
+    in place (mmap.find and bytes regexes) and get() binary-searches the case_id
+    order. Journal records written since the snapshot are applied on top with
+    apply(). Used lock-free while the store is still loading; its own lock only
+    keeps close() from unmapping the file under a read in progress.
+    """
+
+    def __init__(self, path):
+        self.lock = threading.RLock()
+        self.successor = None  # answers the calls made after close(), if given
+        with open(path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.mm)
+        magic, self.rows, count, self.source_size, self.source_mtime_ns = HEADER.unpack_from(self.mm)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a case snapshot")
+        self.columns = {}  # name -> (offsets, heap start, heap end)
+        for n in range(count):
+            name, offsets_position, heap_position, heap_length = COLUMN.unpack_from(
+                self.mm, HEADER.size + n * COLUMN.size)
+            entries = self.rows if name.rstrip(b"\0").decode() == ID_ORDER else self.rows + 1
+            offsets = self.view[offsets_position:offsets_position + 8 * entries].cast("Q")
+            self.columns[name.rstrip(b"\0").decode()] = (offsets, heap_position, heap_position + heap_length)
+        self.overlay = {}  # case_id -> CaseRecord, or None once deleted, from the journal
+
+    @classmethod
+    def open(cls, path, source_path):
+        """Map path if it still mirrors source_path (same size and mtime), else return None."""
+        try:
+            snapshot = cls(path)
+        except (OSError, ValueError, struct.error):
+            return None
+        try:
+            stat = os.stat(source_path)
+        except OSError:
+            stat = None
+        if stat is None or (stat.st_size, stat.st_mtime_ns) != (snapshot.source_size, snapshot.source_mtime_ns):
+            snapshot.close()
+            return None
+        return snapshot
+
+    def apply(self, op, payload):
+        """Layer one journal record (as CaseStore.load would replay it) over the snapshot."""
+        if op == "delete":
+            self.overlay[payload] = None
+        else:
+            record = payload if isinstance(payload, CaseRecord) else CaseRecord.from_dict(payload)
+            self.overlay[record.case_id] = record
+
+    def close(self, successor=None):
+        """Unmap the file, once reads in progress finish; later reads go to successor."""
+        with self.lock:
+            if self.mm is None:
+                return
+            self.columns = {}
+            self.view.release()
+            self.mm.close()
+            self.mm = None
+            self.successor = successor
+
+    @_reading
+    def __len__(self):
+        present = sum(1 for case_id in self.overlay if self._row_of(case_id) is not None)
+        live = sum(1 for record in self.overlay.values() if record is not None)
+        return self.rows - present + live
+
+    def value(self, name, row):
+        offsets, start, _ = self.columns[name]
+        return self.mm[start + offsets[row]:start + offsets[row + 1] - 1].decode("utf-8")
+
+    def record(self, row):
+        return CaseRecord(*(self.value(field, row) for field in RECORD_FIELDS))
+
+    @_reading
+    def get(self, case_id):
+        """Return the case as a dict with email_count/phone_count, like CaseStore.get, or None."""
+        if case_id in self.overlay:
+            record = self.overlay[case_id]
+        else:
+            row = self._row_of(case_id)
+            record = self.record(row) if row is not None else None
+        if record is None:
+            return None
+        email = normalize_email(record.email)
+        phone = normalize_phone(record.phone_number)
+        return dict(record.to_dict(),
+                    email_count=str(self.email_count(email)) if email else "",
+                    phone_count=str(self.phone_count(phone)) if phone else "")
+
+    @_reading
+    def email_count(self, email):
+        return self._count("email", normalize_email(email))
+
+    @_reading
+    def phone_count(self, phone):
+        return self._count("phone_number", normalize_phone(phone))
+
+    @_reading
+    def search(self, query, check=None):
+        """Case_ids whose case_id, phone or email match the (lowercase) query, in file order.
+
+        Same rules as SearchIndex.search: a "*" makes it an fnmatch pattern, anything
+        else is a substring. check() is called between columns and may raise to abort.
+        """
+        if "*" in query:
+            regex = re.compile(_translate(query), re.MULTILINE)
+            predicate = lambda value: regex.fullmatch(value.encode("utf-8")) is not None
+        else:
+            regex = None
+            predicate = lambda value: query in value
+        rows = set()
+        for name in SEARCH_COLUMNS:
+            if check is not None:
+                check()
+            rows.update(self._scan(name, query, regex))
+        ids = []
+        for row in sorted(rows):
+            case_id = self.value("case_id", row)
+            if case_id not in self.overlay:
+                ids.append(case_id)
+        for case_id, record in self.overlay.items():
+            if record is not None and any(predicate(search_value(record.get(field))) for field in SEARCH_FIELDS):
+                ids.append(case_id)
+        return ids
+
+    def _scan(self, name, query, regex):
+        """Row numbers whose value in column name matches, found directly in the mapped heap."""
+        offsets, start, end = self.columns[name]
+        if regex is not None:
+            for match in regex.finditer(self.mm, start, end):
+                row = bisect_right(offsets, match.start() - start) - 1
+                # Skip empty matches at the heap's edges, which belong to no value.
+                if 0 <= row < self.rows and offsets[row] == match.start() - start:
+                    yield row
+            return
+        needle = query.encode("utf-8")
+        position = self.mm.find(needle, start, end)
+        while position != -1:
+            row = bisect_right(offsets, position - start) - 1
+            yield row
+            # One hit per value is enough; resume at the next one.
+            position = self.mm.find(needle, start + offsets[row + 1], end)
+
+    def _count(self, field, key):
+        key = contact_key(field, key)
+        if not key:
+            return 0
+        offsets, start, end = self.columns["key." + field]
+        needle = b"\n" + key.encode("utf-8") + b"\n"
+        count = 0
+        position = self.mm.find(needle, start, end)
+        while position != -1:
+            count += 1
+            position = self.mm.find(needle, position + len(needle) - 1, end)
+        # Journal records replace or remove snapshot rows.
+        for case_id, record in self.overlay.items():
+            row = self._row_of(case_id)
+            if row is not None and self.value("key." + field, row) == key:
+                count -= 1
+            if record is not None and contact_key(field, record.get(field)) == key:
+                count += 1
+        return count
+
+    def _row_of(self, case_id):
+        order = self.columns[ID_ORDER][0]
+        lo, hi = 0, len(order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.value("case_id", order[mid]) < case_id:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(order) and self.value("case_id", order[lo]) == case_id:
+            return order[lo]
+        return None
+
+
+def _align(position):
+    return (position + 7) & ~7
+
+
+def _translate(pattern):
+    """fnmatch pattern -> bytes regex matching one whole newline-separated value."""
+    parts, i = [rb"^"], 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "*":
+            # Any run of bytes short of the separator is whole characters here.
+            parts.append(rb"[^\n]*")
+        elif c == "?":
+            parts.append(ANY_CHAR)
+        elif c == "[" and pattern.find("]", i + 2) != -1:
+            end = pattern.find("]", i + 2)
+            body = pattern[i + 1:end]
+            negate = body.startswith("!")
+            body = body[1:] if negate else body
+            parts.append(b"[" + (b"^\n" if negate else b"") + re.escape(body.encode("utf-8")).replace(b"\\-", b"-") + b"]")
+            i = end
+        else:
+            parts.append(re.escape(c.encode("utf-8")))
+        i += 1
+    parts.append(rb"$")
+    return b"".join(parts)
@@ -0,0 +1,633 @@
+import argparse
+import csv
+import fnmatch
+import gzip
+import json
+import os
+import sqlite3
+import string
+import time
+from collections import Counter
+from datetime import date
+from operator import itemgetter
+
+from journal import Journal
+from records import RECORD_FIELDS, CaseRecord, normalize_email, normalize_phone
+from snapshot import CaseSnapshot, SnapshotWriter
+
+CSV_FILE = "cases.csv"
+# Absolute, so the desktop app, the Flask app and the scripts all open one database.
+DB_FILE = os.path.abspath(os.environ.get("CRM_DB", "crm.db"))
+# Journal records are folded back into the CSV after this many commits.
+COMPACT_EVERY = 500
+# Updated CSV schema: two separate count fields.
+FIELDNAMES = ["case_id", "timestamp", "phone_number", "email", "main_reaction", "main_response", "email_count", "phone_count", "comments"]
+# Columns persisted by the SQLite backend (counts are derived, never stored).
+DB_FIELDS = list(RECORD_FIELDS)
+# Read buffer for streaming the cases file.
+READ_CHUNK = 1 << 20
+# Rows per executemany() transaction when bulk importing.
+IMPORT_BATCH = 50000
+# Partitioned storage: one file per month of case timestamp, under PARTITION_DIR.
+PARTITION_DIR = "cases"
+# Months (counting the current one) kept as plain CSV; older months become gzip archives.
+HOT_MONTHS = 3
+# Partition of cases without a usable timestamp; never archived.
+UNDATED = "undated"
+# How long a writer waits for another process's write lock before "database is locked".
+BUSY_TIMEOUT_MS = 5000
+
+# Normalized contact keys, generated by SQLite so every writer (desktop, Flask, bulk
+# import, any other SQLite client) keeps them in step; crm.db's duplicate counts group
+# on these. Only SQL built-ins: the canonical keys of records.normalize_email/
+# normalize_phone are for the in-memory counters and contacts.py.
+NORMALIZED_COLUMNS = {
+    "email_normalized": "lower(trim(email))",
+    "phone_normalized": "trim(phone_number)",
+}
+# SQLite's lower() only folds ASCII letters.
+ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+# Same table the Flask app's Case model maps to, so both front ends share crm.db.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS "case" (
+    id INTEGER NOT NULL PRIMARY KEY,
+    case_id VARCHAR(20) NOT NULL UNIQUE,
+    phone_number VARCHAR(20) NOT NULL,
+    email VARCHAR(100) NOT NULL,
+    main_reaction VARCHAR(50),
+    main_response VARCHAR(50),
+    call_count INTEGER,
+    comments TEXT,
+    timestamp DATETIME,
+    email_normalized VARCHAR(100) GENERATED ALWAYS AS ({email_normalized}) VIRTUAL,
+    phone_normalized VARCHAR(20) GENERATED ALWAYS AS ({phone_normalized}) VIRTUAL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS ix_case_case_id ON "case" (case_id);
+CREATE INDEX IF NOT EXISTS ix_case_phone_number ON "case" (phone_number);
+CREATE INDEX IF NOT EXISTS ix_case_timestamp ON "case" (timestamp);
+""".format(**NORMALIZED_COLUMNS)
+# Cases per normalized email/phone, kept current by triggers on every insert, delete and
+# contact edit; call_count of a new case is its number's count at insert time.
+CONTACT_SCHEMA = [
+    'CREATE INDEX IF NOT EXISTS ix_case_email_normalized ON "case" (email_normalized)',
+    'CREATE INDEX IF NOT EXISTS ix_case_phone_normalized ON "case" (phone_normalized)',
+    """CREATE TABLE IF NOT EXISTS contact_count (
+        kind VARCHAR(5) NOT NULL,
+        value VARCHAR(100) NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (kind, value)
+    ) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS ix_contact_count_kind_count ON contact_count (kind, count)",
+    """CREATE TRIGGER IF NOT EXISTS case_contact_insert AFTER INSERT ON "case" BEGIN
+        INSERT INTO contact_count (kind, value, count) SELECT 'email', NEW.email_normalized, 1
+            WHERE NEW.email_normalized != '' ON CONFLICT (kind, value) DO UPDATE SET count = count + 1;
+        INSERT INTO contact_count (kind, value, count) SELECT 'phone', NEW.phone_normalized, 1
+            WHERE NEW.phone_normalized != '' ON CONFLICT (kind, value) DO UPDATE SET count = count + 1;
+        UPDATE "case" SET call_count = (SELECT count FROM contact_count
+            WHERE kind = 'phone' AND value = NEW.phone_normalized) WHERE id = NEW.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS case_contact_delete AFTER DELETE ON "case" BEGIN
+        UPDATE contact_count SET count = count - 1
+            WHERE (kind = 'email' AND value = OLD.email_normalized) OR (kind = 'phone' AND value = OLD.phone_normalized);
+        DELETE FROM contact_count WHERE count <= 0
+            AND ((kind = 'email' AND value = OLD.email_normalized) OR (kind = 'phone' AND value = OLD.phone_normalized));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS case_contact_update AFTER UPDATE OF email, phone_number ON "case" BEGIN
+        UPDATE contact_count SET count = count - 1
+            WHERE (kind = 'email' AND value = OLD.email_normalized) OR (kind = 'phone' AND value = OLD.phone_normalized);
+        DELETE FROM contact_count WHERE count <= 0
+            AND ((kind = 'email' AND value = OLD.email_normalized) OR (kind = 'phone' AND value = OLD.phone_normalized));
+        INSERT INTO contact_count (kind, value, count) SELECT 'email', NEW.email_normalized, 1
+            WHERE NEW.email_normalized != '' ON CONFLICT (kind, value) DO UPDATE SET count = count + 1;
+        INSERT INTO contact_count (kind, value, count) SELECT 'phone', NEW.phone_normalized, 1
+            WHERE NEW.phone_normalized != '' ON CONFLICT (kind, value) DO UPDATE SET count = count + 1;
+    END""",
+]
+# Change counter bumped once per insert, delete or edit of a case (call_count, which the
+# insert trigger sets, excluded); the Flask app's response caches compare it across processes.
+GENERATION_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS case_generation (
+        id INTEGER NOT NULL PRIMARY KEY CHECK (id = 1),
+        generation INTEGER NOT NULL
+    )""",
+    "INSERT OR IGNORE INTO case_generation (id, generation) VALUES (1, 0)",
+    """CREATE TRIGGER IF NOT EXISTS case_generation_insert AFTER INSERT ON "case" BEGIN
+        UPDATE case_generation SET generation = generation + 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS case_generation_delete AFTER DELETE ON "case" BEGIN
+        UPDATE case_generation SET generation = generation + 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS case_generation_update AFTER UPDATE OF
+            case_id, phone_number, email, main_reaction, main_response, comments, timestamp ON "case" BEGIN
+        UPDATE case_generation SET generation = generation + 1;
+    END""",
+]
+# GROUP BY aggregates the summary is rebuilt from (and checked against).
+CONTACT_COUNT_QUERIES = {
+    kind: f"""SELECT {column} AS value, count(*) AS count FROM "case" WHERE {column} != '' GROUP BY {column}"""
+    for kind, column in (("email", "email_normalized"), ("phone", "phone_normalized"))
+}
+UPSERT = (f'INSERT INTO "case" ({", ".join(DB_FIELDS)}) VALUES ({", ".join("?" * len(DB_FIELDS))}) '
+          f'ON CONFLICT(case_id) DO UPDATE SET '
+          + ", ".join(f"{field} = excluded.{field}" for field in DB_FIELDS if field != "case_id"))
+
+
+class CsvBackend:
+    """cases.csv plus an append-only journal that is compacted back into it.
+
+    Every compaction also writes cases.csv.snap, a columnar snapshot that
+    snapshot() maps for instant reads at the next startup.
+    """
+
+    def __init__(self, path=CSV_FILE, compact_every=COMPACT_EVERY):
+        self.path = path
+        self.compact_every = compact_every
+        self.journal = Journal(path + ".journal")
+        self.snapshot_path = path + ".snap"
+        self.history_path = path + ".history"
+
+    def load(self):
+        """Yield (op, row) for every CSV row followed by the journal records."""
+        if os.path.exists(self.path):
+            yield from (("insert", record) for record in read_records(self.path))
+        for record in self.journal.replay():
+            if record["op"] == "delete":
+                yield "delete", record["case_id"]
+            else:
+                yield record["op"], record["row"]
+
+    def write(self, op, row=None, case_id=None):
+        self.journal.append(op, row=row, case_id=case_id)
+
+    def wants_compaction(self):
+        return len(self.journal) >= self.compact_every
+
+    def snapshot(self):
+        """Map the snapshot with the journal applied on top, or None if it is missing or stale."""
+        snapshot = CaseSnapshot.open(self.snapshot_path, self.path)
+        if snapshot is not None:
+            for record in self.journal.replay():
+                snapshot.apply(record["op"], record["case_id"] if record["op"] == "delete" else record["row"])
+        return snapshot
+
+    def compact(self, rows):
+        """Atomically rewrite the CSV (temp file + rename) and its snapshot, and clear the journal."""
+        tmp_path = self.path + ".tmp"
+        snapshot = SnapshotWriter()
+        with open(tmp_path, "w", newline='', encoding="utf-8") as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=FIELDNAMES)
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(row)
+                snapshot.add(row)
+            csvfile.flush()
+            os.fsync(csvfile.fileno())
+        os.replace(tmp_path, self.path)
+        # Stamped with the new CSV's size and mtime; a crash before this leaves a stale, ignored one.
+        snapshot.write(self.snapshot_path, os.stat(self.path))
+        self.journal.truncate()
+
+    def close(self, rows):
+        """Fold pending journal records into the CSV, or write a missing snapshot (skipped when rows is None)."""
+        if rows is not None and (len(self.journal) or not self._snapshot_fresh()):
+            self.compact(rows)
+        self.journal.close()
+
+    def _snapshot_fresh(self):
+        snapshot = CaseSnapshot.open(self.snapshot_path, self.path)
+        if snapshot is None:
+            return False
+        snapshot.close()
+        return True
+
+
+class ArchiveSummary:
+    """What the store keeps of an archived partition it has not loaded.
+
+    rows, case_ids and keys (lowercased case_ids, emails and phones, for deciding
+    whether a search needs the partition) stay; the contact counts, by normalized
+    email and phone, are merged into the store's counters once and then dropped.
+    """
+
+    __slots__ = ("name", "rows", "case_ids", "keys", "email_counts", "phone_counts")
+
+    def __init__(self, name, rows, case_ids, keys, email_counts, phone_counts):
+        self.name = name
+        self.rows = rows
+        self.case_ids = case_ids
+        self.keys = keys
+        self.email_counts = email_counts
+        self.phone_counts = phone_counts
+
+    def matches(self, query):
+        """True if any case in the partition could match the (lowercase) search query."""
+        if "*" not in query:
+            return any(query in key for key in self.keys)
+        return any(fnmatch.fnmatchcase(key, query) for key in self.keys)
+
+
+class PartitionedBackend:
+    """Cases split into monthly partitions by timestamp, with a manifest and one shared journal.
+
+    Recent months are plain CSVs loaded at startup. Months older than hot_months
+    are read-only gzip archives: at startup the store only gets an ArchiveSummary
+    of each and reads the rows with load_partition() when a search needs them.
+    Compaction rewrites just the partitions written to since the last one, and
+    archives months as they age out. Without a manifest, an existing legacy
+    cases.csv is read once and split into partitions at the first compaction.
+    """
+
+    def __init__(self, directory=PARTITION_DIR, hot_months=HOT_MONTHS, compact_every=COMPACT_EVERY,
+                 legacy_csv=CSV_FILE):
+        self.directory = directory
+        self.hot_months = hot_months
+        self.compact_every = compact_every
+        self.legacy_csv = legacy_csv
+        os.makedirs(directory, exist_ok=True)
+        self.manifest_path = os.path.join(directory, "manifest.json")
+        self.journal = Journal(os.path.join(directory, "journal"))
+        self.history_path = os.path.join(directory, "history")
+        self.partitions = {}  # name -> {"file", "archived", "rows"}
+        self.loaded = set()   # partitions whose rows are in the store
+        self.dirty = set()    # partitions written to since the last compaction
+        self.months = {}      # case_id -> partition, for every loaded case
+
+    def load(self):
+        """Yield the hot partitions' rows, an ("archive", ArchiveSummary) per other archive, then the journal."""
+        self.partitions = self._read_manifest()
+        self.loaded, self.dirty, self.months = set(), set(), {}
+        records = list(self.journal.replay())
+        summaries = {name: self._read_summary(name) for name, entry in self.partitions.items() if entry["archived"]}
+        # Archives the journal writes to are loaded, so its records apply on top of their rows.
+        touched = set()
+        for record in records:
+            case_id = record.get("case_id") or record["row"]["case_id"]
+            if "row" in record:
+                touched.add(partition_of(record["row"].get("timestamp")))
+            touched.update(name for name, summary in summaries.items() if case_id in summary["case_ids"])
+        if not self.partitions and os.path.exists(self.legacy_csv):
+            for record in read_records(self.legacy_csv):
+                self._track(record.case_id, partition_of(record.timestamp))
+                yield "insert", record
+            self.dirty.update(self.loaded)
+        for name in sorted(self.partitions):
+            if name in summaries and name not in touched:
+                yield "archive", self._summary(name, summaries[name])
+            else:
+                yield from (("insert", record) for record in self.load_partition(name))
+        for record in records:
+            if record["op"] == "delete":
+                self._note("delete", None, record["case_id"])
+                yield "delete", record["case_id"]
+            else:
+                self._note(record["op"], record["row"], None)
+                yield record["op"], record["row"]
+
+    def snapshot(self):
+        return None
+
+    def load_partition(self, name):
+        """Yield the CaseRecords of one partition (e.g. an archive a search needs)."""
+        self.loaded.add(name)
+        for record in read_records(self._path(name)):
+            self.months[record.case_id] = name
+            yield record
+
+    def write(self, op, row=None, case_id=None):
+        self.journal.append(op, row=row, case_id=case_id)
+        self._note(op, row, case_id)
+
+    def wants_compaction(self):
+        return len(self.journal) >= self.compact_every
+
+    def compact(self, rows):
+        """Rewrite the partitions written to or aged out since the last compaction, then the manifest."""
+        cutoff = archive_cutoff(self.hot_months)
+        targets = set(self.dirty)
+        targets.update(name for name, entry in self.partitions.items()
+                       if not entry["archived"] and is_archived(name, cutoff))
+        grouped = {name: {} for name in targets}
+        for row in rows:
+            name = self.months.get(row["case_id"]) or partition_of(row["timestamp"])
+            if name in grouped:
+                grouped[name][row["case_id"]] = row
+        stale = []
+        for name in sorted(targets):
+            part = grouped[name]
+            if name in self.partitions and name not in self.loaded:
+                # Written to without being loaded (e.g. a case dated into an archived month): merge.
+                existing = {record.case_id: record.to_dict() for record in read_records(self._path(name))}
+                existing.update(part)
+                part = existing
+            old = self.partitions.pop(name, None)
+            entry = self._write_partition(name, list(part.values()), is_archived(name, cutoff)) if part else None
+            if entry is not None:
+                self.partitions[name] = entry
+            if old is not None and (entry is None or entry["file"] != old["file"]):
+                stale.append(old)
+        _write_atomic(self.manifest_path, json.dumps({"partitions": self.partitions}, indent=1, sort_keys=True))
+        # Only once the manifest no longer points at them.
+        for old in stale:
+            os.remove(os.path.join(self.directory, old["file"]))
+            if old["archived"] and not self.partitions.get(old["file"].split(".")[0], {}).get("archived"):
+                os.remove(self._summary_path(old["file"]))
+        self.journal.truncate()
+        self.dirty.clear()
+
+    def close(self, rows):
+        """Compact pending writes and aged-out months (skipped when rows is None)."""
+        if rows is not None and (len(self.journal) or self.dirty or self._aged()):
+            self.compact(rows)
+        self.journal.close()
+
+    def _aged(self):
+        cutoff = archive_cutoff(self.hot_months)
+        return any(not entry["archived"] and is_archived(name, cutoff) for name, entry in self.partitions.items())
+
+    def _track(self, case_id, name):
+        self.months[case_id] = name
+        self.loaded.add(name)
+
+    def _note(self, op, row, case_id):
+        # Both the partition a case leaves and the one it lands in need rewriting.
+        old = self.months.pop(case_id if row is None else row["case_id"], None)
+        if old is not None:
+            self.dirty.add(old)
+        if op != "delete":
+            name = partition_of(row.get("timestamp"))
+            self.months[row["case_id"]] = name
+            self.dirty.add(name)
+
+    def _path(self, name):
+        return os.path.join(self.directory, self.partitions[name]["file"])
+
+    def _summary_path(self, filename):
+        return os.path.join(self.directory, filename.split(".")[0] + ".summary.json.gz")
+
+    def _read_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path, encoding="utf-8") as f:
+            return json.load(f)["partitions"]
+
+    def _read_summary(self, name):
+        with gzip.open(self._summary_path(self.partitions[name]["file"]), "rt", encoding="utf-8") as f:
+            summary = json.load(f)
+        summary["case_ids"] = set(summary["case_ids"])
+        return summary
+
+    def _summary(self, name, summary):
+        keys = [case_id.lower() for case_id in summary["case_ids"]]
+        keys += summary["emails"]
+        keys += (phone.lower() for phone in summary["phones"])
+        # Summaries count the contacts as written; normalizing them here keeps older summaries valid.
+        counts = {"emails": Counter(), "phones": Counter()}
+        for kind, normalize in (("emails", normalize_email), ("phones", normalize_phone)):
+            for value, count in summary[kind].items():
+                counts[kind][normalize(value)] += count
+            counts[kind].pop("", None)
+        return ArchiveSummary(name, self.partitions[name]["rows"], summary["case_ids"], keys,
+                              counts["emails"], counts["phones"])
+
+    def _write_partition(self, name, rows, archived):
+        """Write one partition (gzip plus a summary if archived) and return its manifest entry."""
+        filename = name + (".csv.gz" if archived else ".csv")
+        path = os.path.join(self.directory, filename)
+        tmp_path = path + ".tmp"
+        opener = gzip.open if archived else open
+        with opener(tmp_path, "wt", newline='', encoding="utf-8") as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=FIELDNAMES, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(rows)
+        _fsync_replace(tmp_path, path)
+        if archived:
+            emails = Counter((row.get("email") or "").lower() for row in rows)
+            phones = Counter(row.get("phone_number") or "" for row in rows)
+            emails.pop("", None)
+            phones.pop("", None)
+            summary = {"case_ids": [row["case_id"] for row in rows], "emails": emails, "phones": phones}
+            summary_path = self._summary_path(filename)
+            with gzip.open(summary_path + ".tmp", "wt", encoding="utf-8") as f:
+                json.dump(summary, f)
+            _fsync_replace(summary_path + ".tmp", summary_path)
+        return {"file": filename, "archived": archived, "rows": len(rows)}
+
+
+class SqliteBackend:
+    """The Flask app's "case" table in crm.db, in WAL mode with lookup indexes."""
+
+    def __init__(self, path=DB_FILE):
+        self.path = path
+        self.conn = connect(path)
+        self.history_path = path + ".history"
+
+    def load(self):
+        cursor = self.conn.execute(f'SELECT {", ".join(DB_FIELDS)} FROM "case" ORDER BY id')
+        for values in cursor:
+            yield "insert", CaseRecord(*("" if value is None else str(value) for value in values))
+
+    def write(self, op, row=None, case_id=None):
+        with self.conn:
+            if op == "delete":
+                self.conn.execute('DELETE FROM "case" WHERE case_id = ?', (case_id,))
+            else:
+                self.conn.execute(UPSERT, db_values(row))
+
+    def wants_compaction(self):
+        return False
+
+    def snapshot(self):
+        return None
+
+    def compact(self, rows):
+        pass
+
+    def close(self, rows):
+        self.conn.close()
+
+
+def db_values(row):
+    """UPSERT parameters for a row dict. A missing timestamp is NULL, which the Flask model reads as None."""
+    values = [row.get(field) or "" for field in DB_FIELDS]
+    values[DB_FIELDS.index("timestamp")] = row.get("timestamp") or None
+    return values
+
+
+def partition_of(timestamp):
+    """Month partition ("2024-05") of a case timestamp, or UNDATED."""
+    month = (timestamp or "")[:7]
+    if len(month) == 7 and month[4] == "-" and month[:4].isdigit() and month[5:].isdigit():
+        return month
+    return UNDATED
+
+
+def archive_cutoff(hot_months=HOT_MONTHS, today=None):
+    """First month that is still hot: partitions before it are archived."""
+    today = today or date.today()
+    index = today.year * 12 + today.month - 1 - (hot_months - 1)
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def is_archived(name, cutoff):
+    return name != UNDATED and name < cutoff
+
+
+def _fsync_replace(tmp_path, path):
+    with open(tmp_path, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _write_atomic(path, text):
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(text)
+    _fsync_replace(path + ".tmp", path)
+
+
+def read_records(path, chunk_size=READ_CHUNK):
+    """Stream a cases CSV (or a gzip archive of one) as CaseRecords through a large read buffer.
+
+    Columns are picked by position (an itemgetter built from the header) instead
+    of building a dict per row; quoted multi-line comments are handled by csv.
+    """
+    if path.endswith(".gz"):
+        opened = gzip.open(path, "rt", newline='', encoding="utf-8")
+    else:
+        opened = open(path, newline='', encoding="utf-8", buffering=chunk_size)
+    with opened as csvfile:
+        reader = csv.reader(csvfile)
+        header = next(reader, None)
+        if header is None:
+            return
+        # Missing columns read from one extra empty cell past the header's width.
+        width = len(header)
+        pick = itemgetter(*(header.index(field) if field in header else width for field in RECORD_FIELDS))
+        padding = [""] * (width + 1)
+        for values in reader:
+            if len(values) <= width:
+                if not values:
+                    continue
+                values += padding[len(values):]
+            yield CaseRecord(*pick(values))
+
+
+def connect(path=DB_FILE):
+    """Open crm.db in WAL mode and make sure the case table and its indexes exist."""
+    # The store lock serializes access, so the connection may move between threads.
+    conn = sqlite3.connect(path, check_same_thread=False)
+    apply_pragmas(conn)
+    conn.executescript(SCHEMA)
+    migrate_schema(conn)
+    return conn
+
+
+def apply_pragmas(conn):
+    """Per-connection settings shared with the Flask app's engine.
+
+    WAL lets readers run alongside the single writer, synchronous=NORMAL only
+    fsyncs at checkpoints, and busy_timeout makes concurrent writers wait for
+    the lock instead of failing straight away.
+    """
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+
+
+def migrate_schema(conn):
+    """Bring an older crm.db up to date: contact columns and indexes, contact_count, case_generation.
+
+    Columns generated by an older normalization are dropped (with the indexes
+    and triggers using them) and re-added. The summary is rebuilt from the
+    GROUP BY aggregates whenever its triggers were missing, i.e. the first time
+    a database is opened by this version. Empty timestamps become NULL.
+    """
+    table_sql = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'case'").fetchone()[0]
+    columns = {row[1] for row in conn.execute('PRAGMA table_xinfo("case")')}
+    outdated = [name for name, expression in NORMALIZED_COLUMNS.items() if name in columns and expression not in table_sql]
+    if outdated:
+        for trigger in ("case_contact_insert", "case_contact_delete", "case_contact_update"):
+            conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        for name in outdated:
+            conn.execute(f"DROP INDEX IF EXISTS ix_case_{name}")
+            conn.execute(f'ALTER TABLE "case" DROP COLUMN {name}')
+            columns.discard(name)
+    for name, expression in NORMALIZED_COLUMNS.items():
+        if name not in columns:
+            conn.execute(f'ALTER TABLE "case" ADD COLUMN {name} VARCHAR(100) GENERATED ALWAYS AS ({expression}) VIRTUAL')
+    # Superseded by ix_case_email_normalized.
+    conn.execute("DROP INDEX IF EXISTS ix_case_email_lower")
+    # Older desktop writes and imports stored missing timestamps as '', which the Flask model cannot parse.
+    conn.execute("""UPDATE "case" SET timestamp = NULL WHERE timestamp = ''""")
+    stale = not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'case_contact_insert'").fetchone()
+    for statement in CONTACT_SCHEMA + GENERATION_SCHEMA:
+        conn.execute(statement)
+    if stale:
+        rebuild_contact_counts(conn)
+    conn.commit()
+
+
+def email_column_key(email):
+    """The email_normalized value SQLite generates for email, for querying that column."""
+    return (email or "").strip(" ").translate(ASCII_LOWER)
+
+
+def phone_column_key(phone):
+    """The phone_normalized value SQLite generates for phone, for querying that column."""
+    return (phone or "").strip(" ")
+
+
+def rebuild_contact_counts(conn):
+    """Recompute contact_count from scratch with one GROUP BY per kind."""
+    conn.execute("DELETE FROM contact_count")
+    for kind, query in CONTACT_COUNT_QUERIES.items():
+        conn.execute(f"INSERT INTO contact_count (kind, value, count) SELECT '{kind}', * FROM ({query})")
+
+
+def open_backend(kind=None):
+    """Return the backend selected by CRM_STORAGE ("csv", the default, "partitioned" or "sqlite")."""
+    kind = kind or os.environ.get("CRM_STORAGE", "csv")
+    if kind == "sqlite":
+        return SqliteBackend(DB_FILE)
+    if kind == "partitioned":
+        return PartitionedBackend(PARTITION_DIR)
+    if kind == "csv":
+        return CsvBackend(CSV_FILE)
+    raise ValueError(f"Unknown storage backend: {kind}")
+
+
+def import_csv(csv_path=CSV_FILE, db_path=DB_FILE, batch_size=IMPORT_BATCH):
+    """Bulk load cases.csv into crm.db with executemany, one transaction per batch."""
+    conn = connect(db_path)
+    count = 0
+    try:
+        with open(csv_path, newline='', encoding="utf-8") as csvfile:
+            batch = []
+            for row in csv.DictReader(csvfile):
+                batch.append(db_values(row))
+                if len(batch) >= batch_size:
+                    with conn:
+                        conn.executemany(UPSERT, batch)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                with conn:
+                    conn.executemany(UPSERT, batch)
+                count += len(batch)
+    finally:
+        conn.close()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import cases.csv into the SQLite database.")
+    parser.add_argument("csv_path", nargs="?", default=CSV_FILE)
+    parser.add_argument("db_path", nargs="?", default=DB_FILE)
+    args = parser.parse_args()
+    start = time.perf_counter()
+    count = import_csv(args.csv_path, args.db_path)
+    print(f"Imported {count} cases into {args.db_path} in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger(__name__)
+
+
+class Cancelled(Exception):
+    """Raised inside a task once a newer task with the same key has replaced it."""
+
+
+class Task:
+    """Handle passed to a running job to report progress and notice cancellation."""
+
+    def __init__(self, runner, key, on_done, on_error, on_progress):
+        self.runner = runner
+        self.key = key
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.cancel_event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def check(self):
+        """Abort the job (from the worker thread) if it has been cancelled."""
+        if self.cancel_event.is_set():
+            raise Cancelled()
+
+    def progress(self, value):
+        if self.on_progress is not None and not self.cancelled:
+            self.runner.results.put((self, "progress", value))
+
+
+class TaskRunner:
+    """Runs store operations on a worker pool so the Tk mainloop never blocks.
+
+    Results, errors and progress updates are queued by the workers and
+    delivered to the callbacks on the Tk thread by polling with after().
+    Errors without an on_error, and exceptions raised by callbacks, are logged.
+    Submitting a task with the same key as a pending one cancels the older task
+    and drops its result, e.g. a stale search superseded by a new query, so
+    only reads get a key.
+    """
+
+    def __init__(self, widget, max_workers=2, poll_ms=50):
+        self.widget = widget
+        self.poll_ms = poll_ms
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="crm-worker")
+        self.results = queue.Queue()
+        self.pending = {}  # key -> latest Task
+        self._closed = False
+        self.widget.after(self.poll_ms, self._poll)
+
+    def submit(self, fn, key=None, on_done=None, on_error=None, on_progress=None):
+        """Run fn(task) in the pool; on_done/on_error/on_progress are called on the Tk thread."""
+        task = Task(self, key, on_done, on_error, on_progress)
+        if key is not None:
+            previous = self.pending.get(key)
+            if previous is not None:
+                previous.cancel()
+            self.pending[key] = task
+        self.executor.submit(self._run, task, fn)
+        return task
+
+    def shutdown(self):
+        """Cancel the keyed tasks and wait for the others to finish.
+
+        Keyed tasks are reads that a newer one would replace anyway; they stop at
+        their next check(). Tasks without a key are writes (saves, deletes,
+        undos), so they all still run and the store can be closed after this.
+        """
+        self._closed = True
+        for task in self.pending.values():
+            task.cancel()
+        self.executor.shutdown(wait=True)
+
+    def _run(self, task, fn):
+        if task.cancelled:
+            return
+        try:
+            result = fn(task)
+        except Cancelled:
+            return
+        except Exception as e:
+            self.results.put((task, "error", e))
+        else:
+            self.results.put((task, "done", result))
+
+    def _poll(self):
+        if self._closed:
+            return
+        try:
+            while True:
+                try:
+                    task, kind, value = self.results.get_nowait()
+                except queue.Empty:
+                    break
+                if task.cancelled:
+                    continue
+                if kind != "progress" and task.key is not None and self.pending.get(task.key) is task:
+                    del self.pending[task.key]
+                callback = {"progress": task.on_progress, "done": task.on_done, "error": task.on_error}[kind]
+                if callback is None:
+                    if kind == "error":
+                        log.error("Task %s failed", task.key, exc_info=value)
+                    continue
+                try:
+                    callback(value)
+                except Exception:
+                    # Keep delivering the other results; one broken callback must not stop polling.
+                    log.exception("Callback of task %s failed", task.key)
+        finally:
+            self.widget.after(self.poll_ms, self._poll)
@@ -0,0 +1,48 @@
+"""Production entry point for the Flask app.
+
+Run with any WSGI server from src/, e.g. ``gunicorn -w 4 wsgi:app``, or
+``python3 wsgi.py`` to start gunicorn with the settings below.
+"""
+import argparse
+import os
+
+os.environ.setdefault("CRM_PROFILE", "production")
+
+from main_using_flask import app, db, init_db
+
+# SQLite has one writer at a time, so a few processes with a few threads each
+# beat many processes all waiting on the write lock.
+WORKERS = 4
+THREADS = 4
+
+with app.app_context():
+    init_db()
+    # Workers fork after this; they must open their own connections.
+    db.engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the CRM web app with gunicorn.")
+    parser.add_argument("--bind", default="127.0.0.1:8000")
+    parser.add_argument("-w", "--workers", type=int, default=WORKERS)
+    parser.add_argument("--threads", type=int, default=THREADS)
+    args = parser.parse_args()
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        parser.exit(1, "gunicorn is required: pip install gunicorn\n")
+
+    class Server(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", args.bind)
+            self.cfg.set("workers", args.workers)
+            self.cfg.set("threads", args.threads)
+
+        def load(self):
+            return app
+
+    Server().run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import pytest
+
+from contacts import find_duplicates, within_one_edit
+from records import CaseRecord
+
+
+def record(case_id, phone, email):
+    return CaseRecord(case_id=case_id, phone_number=phone, email=email)
+
+
+@pytest.mark.parametrize("a, b", [("6912345678", "6912345678"), ("6912345678", "6912345679"),
+                                  ("6912345678", "691234567"), ("6912345678", "69123456789"),
+                                  ("6912345678", "6921345678"), ("maria@gmail.com", "mraia@gmail.com")])
+def test_within_one_edit(a, b):
+    assert within_one_edit(a, b)
+    assert within_one_edit(b, a)
+
+
+@pytest.mark.parametrize("a, b", [("6912345678", "6912345600"), ("6912345678", "69123456"),
+                                  ("6912345678", "9612345687"), ("maria@gmail.com", "nikos@gmail.com")])
+def test_not_within_one_edit(a, b):
+    assert not within_one_edit(a, b)
+
+
+def test_cases_sharing_a_canonical_contact_are_clustered():
+    clusters = find_duplicates([record("c1", "+30 6912345678", "maria@gmail.com"),
+                                record("c2", "0030 6912345678", "other@example.com"),
+                                record("c3", "2101234567", "Maria+crm@googlemail.com"),
+                                record("c4", "2109999999", "nikos@example.com")])
+    assert len(clusters) == 1
+    assert sorted(clusters[0]["case_ids"]) == ["c1", "c2", "c3"]
+    assert {reason for reason, _, _ in clusters[0]["links"]} == {"phone", "email"}
+
+
+def test_typos_in_both_phone_and_email_are_similar():
+    clusters = find_duplicates([record("c1", "6912345678", "maria@example.com"),
+                                record("c2", "6912345687", "mraia@example.com"),
+                                # One typo in the phone but a different email is another contact.
+                                record("c3", "6912345679", "nikos@example.com")])
+    assert len(clusters) == 1
+    assert sorted(clusters[0]["case_ids"]) == ["c1", "c2"]
+    assert [reason for reason, _, _ in clusters[0]["links"]] == ["similar"]
+
+
+def test_min_cases_and_largest_first():
+    rows = [record(f"a{n}", "6911111111", "") for n in range(3)] + [record(f"b{n}", "6922222222", "") for n in range(2)]
+    assert [len(cluster["case_ids"]) for cluster in find_duplicates(rows)] == [3, 2]
+    assert [len(cluster["case_ids"]) for cluster in find_duplicates(rows, min_cases=3)] == [3]
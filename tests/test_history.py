@@ -0,0 +1,137 @@
+import itertools
+import os
+import types
+
+import pytest
+
+import history
+from case_store import CaseStore
+from history import History
+from storage import CsvBackend
+
+
+def case(case_id, phone="6912345678", email="a@example.com", comments=""):
+    return {"case_id": case_id, "timestamp": "2024-05-01 10:00:00", "phone_number": phone, "email": email,
+            "main_reaction": "", "main_response": "", "comments": comments}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Entries are stamped 1, 2, 3, ... so points in time fall between known changes."""
+    ticks = itertools.count(1)
+    monkeypatch.setattr(history, "time", types.SimpleNamespace(time=lambda: next(ticks)))
+
+
+@pytest.fixture
+def path(tmp_path, monkeypatch, clock):
+    monkeypatch.chdir(tmp_path)
+    return str(tmp_path / "cases.csv")
+
+
+def open_store(path):
+    store = CaseStore(CsvBackend(path))
+    # Checkpoint every few entries, so reads span several checkpoints.
+    store.history = History(store.backend.history_path, checkpoint_every=3)
+    return store
+
+
+def test_undo_walks_back_across_checkpoints(path):
+    store = open_store(path)
+    for n in range(7):
+        store.save(case("c1", comments=f"v{n}"))
+    store.save(case("c2"))
+    assert len(store.history.marks) == 2
+
+    for n in reversed(range(6)):
+        assert store.undo("c1")["op"] == "update"
+        assert store.get("c1")["comments"] == f"v{n}"
+    assert store.undo("c1")["op"] == "insert"
+    assert store.get("c1") is None
+    assert store.undo("c1") is None
+    assert store.get("c2") is not None
+    store.close()
+
+
+def test_undo_brings_back_a_deleted_case(path):
+    store = open_store(path)
+    store.save(case("c1", email="b@example.com"))
+    store.delete("c1")
+    assert store.email_count("b@example.com") == 0
+    store.undo("c1")
+    assert store.get("c1")["email"] == "b@example.com"
+    assert store.email_count("b@example.com") == 1
+    store.close()
+
+
+def test_history_survives_reopening(path):
+    store = open_store(path)
+    for n in range(5):
+        store.save(case("c1", comments=f"v{n}"))
+    store.close()
+
+    store = open_store(path)
+    assert [entry["seq"] for entry in store.history.case_entries("c1")] == [5, 4, 3, 2, 1]
+    store.undo("c1")
+    store.undo("c1")
+    assert store.get("c1")["comments"] == "v2"
+    store.close()
+
+    store = open_store(path)
+    # The undos are recorded too, so undoing again keeps going back.
+    store.undo("c1")
+    assert store.get("c1")["comments"] == "v1"
+    store.close()
+
+
+def test_restore_puts_every_case_back_as_it_was(path):
+    store = open_store(path)
+    store.save(case("c1", comments="first"))
+    store.save(case("c2", phone="2101234567"))
+    store.save(case("c3"))
+    when = 3.5
+    store.save(case("c1", comments="second"))
+    store.delete("c2")
+    store.save(case("c4"))
+    for n in range(4):
+        store.save(case("c3", comments=f"v{n}"))
+    store.close()
+
+    store = open_store(path)
+    assert store.case_at("c1", when)["comments"] == "first"
+    assert set(store.view_at(when)) == {"c1", "c2", "c3"}
+    assert store.restore(when) == 4
+    assert sorted(store.rows) == ["c1", "c2", "c3"]
+    assert store.get("c1")["comments"] == "first"
+    assert store.get("c3")["comments"] == ""
+    assert store.phone_count("2101234567") == 1
+    # Already as it was: nothing left to write.
+    assert store.restore(when) == 0
+    store.close()
+
+
+def test_restore_one_case(path):
+    store = open_store(path)
+    store.save(case("c1", comments="first"))
+    store.save(case("c2", comments="first"))
+    store.save(case("c1", comments="second"))
+    store.save(case("c2", comments="second"))
+    assert store.restore(2.5, ["c1"]) == 1
+    assert store.get("c1")["comments"] == "first"
+    assert store.get("c2")["comments"] == "second"
+    store.close()
+
+
+def test_torn_tail_is_cut_off(path):
+    store = open_store(path)
+    store.save(case("c1", comments="v0"))
+    store.save(case("c1", comments="v1"))
+    store.close()
+    with open(store.backend.history_path, "ab") as f:
+        f.write(b'{"seq": 3, "op": "upd')
+
+    log = History(store.backend.history_path, checkpoint_every=3)
+    assert [entry["seq"] for entry in log.case_entries("c1")] == [2, 1]
+    log.record("update", "c1", {"comments": "v1"}, {"comments": "v2"})
+    log.close()
+    assert [entry["seq"] for entry in History(store.backend.history_path).case_entries("c1")] == [3, 2, 1]
+    assert os.path.getsize(store.backend.history_path) == log.size
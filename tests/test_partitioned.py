@@ -0,0 +1,121 @@
+import gzip
+import json
+import os
+from datetime import date
+
+import pytest
+
+from case_store import CaseStore
+from storage import PartitionedBackend
+
+
+def case(case_id, timestamp, phone="6912345678", email="a@example.com", comments=""):
+    return {"case_id": case_id, "timestamp": timestamp, "phone_number": phone, "email": email,
+            "main_reaction": "", "main_response": "", "comments": comments}
+
+
+def this_month():
+    return date.today().strftime("%Y-%m")
+
+
+@pytest.fixture
+def directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return str(tmp_path / "cases")
+
+
+def open_store(directory):
+    backend = PartitionedBackend(directory=directory, legacy_csv=os.path.join(directory, "missing.csv"))
+    return CaseStore(backend)
+
+
+@pytest.fixture
+def archived(directory):
+    """A store with one case in an archived month and one in the current month."""
+    store = open_store(directory)
+    store.save(case("old1", "2001-01-05 10:00:00"))
+    store.save(case("new1", this_month() + "-01 10:00:00"))
+    store.close()
+    return directory
+
+
+def manifest(directory):
+    with open(os.path.join(directory, "manifest.json"), encoding="utf-8") as f:
+        return json.load(f)["partitions"]
+
+
+def test_compaction_splits_by_month_and_archives_old_months(archived):
+    partitions = manifest(archived)
+    assert partitions["2001-01"]["archived"]
+    assert partitions["2001-01"]["file"].endswith(".csv.gz")
+    assert not partitions[this_month()]["archived"]
+    assert os.path.exists(os.path.join(archived, "2001-01.summary.json.gz"))
+
+
+def test_archives_are_summarized_not_loaded(archived):
+    store = open_store(archived)
+    assert list(store.rows) == ["new1"]
+    assert store.archived_rows == 1
+    # The archived case is already counted.
+    assert store.phone_count("6912345678") == 2
+    store.close()
+
+
+def test_search_loads_only_matching_archives(archived):
+    store = open_store(archived)
+    assert store.search("new1") == ["new1"]
+    assert "2001-01" in store.archives
+    assert store.search("old1") == ["old1"]
+    assert not store.archives
+    assert store.phone_count("6912345678") == 2
+    store.close()
+
+
+def test_get_and_contains_load_the_archive_of_the_case(archived):
+    store = open_store(archived)
+    assert "old1" in store
+    assert store.get("old1")["phone_count"] == "2"
+    assert store.get("missing") is None
+    store.close()
+
+
+def test_save_replaces_an_archived_case(archived):
+    store = open_store(archived)
+    store.save(case("old1", "2001-01-05 10:00:00", email="b@example.com", comments="edited"))
+    assert len(store) == 2
+    assert store.email_count("a@example.com") == 1
+    assert store.email_count("b@example.com") == 1
+    store.close()
+
+    # Compaction merged the edit into the archive instead of adding a second copy.
+    with gzip.open(os.path.join(archived, manifest(archived)["2001-01"]["file"]), "rt", encoding="utf-8") as f:
+        assert sum(1 for line in f if line.startswith("old1,")) == 1
+    store = open_store(archived)
+    assert store.get("old1")["comments"] == "edited"
+    assert store.email_count("a@example.com") == 1
+    store.close()
+
+
+def test_delete_removes_an_archived_case(archived):
+    store = open_store(archived)
+    assert store.delete("old1") is not None
+    assert store.phone_count("6912345678") == 1
+    store.close()
+
+    store = open_store(archived)
+    assert "old1" not in store
+    assert "2001-01" not in manifest(archived)
+    store.close()
+
+
+def test_journal_written_to_an_archive_is_replayed_over_it(archived):
+    store = open_store(archived)
+    store.save(case("old2", "2001-01-20 10:00:00"))
+    # Reopen without compacting: the journal still holds the write.
+    store.backend.journal.close()
+    store.history.close()
+
+    store = open_store(archived)
+    assert sorted(store.rows) == ["new1", "old1", "old2"]
+    assert store.phone_count("6912345678") == 3
+    store.close()
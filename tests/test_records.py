@@ -0,0 +1,38 @@
+import pytest
+
+from records import normalize_email, normalize_phone
+
+
+@pytest.mark.parametrize("phone", ["6912345678", "+30 6912345678", "+30 691 234 5678", "0030 6912345678",
+                                   "00306912345678", "306912345678", " 691-234-5678 "])
+def test_local_number_with_or_without_country_code_is_one_phone(phone):
+    assert normalize_phone(phone) == "6912345678"
+
+
+def test_foreign_numbers_keep_their_country_code():
+    assert normalize_phone("+44 20 7946 0958") == "+442079460958"
+    assert normalize_phone("0044 20 7946 0958") == "+442079460958"
+    assert normalize_phone("+44 20 7946 0958") != normalize_phone("20 7946 0958")
+
+
+def test_short_or_empty_numbers_are_just_their_digits():
+    assert normalize_phone("3012") == "3012"
+    assert normalize_phone("") == ""
+    assert normalize_phone(None) == ""
+
+
+@pytest.mark.parametrize("email", ["maria.k@gmail.com", "Maria.K@Gmail.com", "mariak@gmail.com",
+                                   "maria.k+crm@gmail.com", "maria.k@googlemail.com", " mariak@gmail.com. "])
+def test_gmail_aliases_are_one_email(email):
+    assert normalize_email(email) == "mariak@gmail.com"
+
+
+def test_other_domains_keep_their_dots():
+    assert normalize_email("Maria.K+news@Example.com") == "maria.k@example.com"
+    assert normalize_email("maria.k@example.com") != normalize_email("mariak@example.com")
+
+
+def test_malformed_emails_are_only_lowercased():
+    assert normalize_email("+tag@example.com") == "+tag@example.com"
+    assert normalize_email("Not An Email") == "not an email"
+    assert normalize_email(None) == ""
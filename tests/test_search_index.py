@@ -0,0 +1,88 @@
+import fnmatch
+import random
+
+import pytest
+
+from search_index import SEARCH_FIELDS, SearchIndex
+
+QUERIES = ["69*", "*@gmail.com", "*mail*", "mail", "21", "a", "*", "*3?4*", "6[89]*", "*.gr", "c1*",
+           "*[!0-9]", "xyz", "@", "ma?ia*", ""]
+
+
+def case(case_id, phone, email):
+    return {"case_id": case_id, "phone_number": phone, "email": email}
+
+
+def random_case(rng, case_id):
+    phone = rng.choice(["69", "21", "+30 69", "", "3"]) + "".join(rng.choice("0123456789") for _ in range(rng.randint(0, 8)))
+    user = rng.choice(["maria", "nikos", "a", "m.k", "Eleni"]) + str(rng.randint(0, 30))
+    email = rng.choice(["", user + "@gmail.com", user + "@Example.gr", user + "@mail.com", "x"])
+    return case(case_id, phone, email)
+
+
+def brute_force(rows, query):
+    """The search as a plain scan over every row, in insertion order."""
+    def matches(value):
+        value = (value or "").lower()
+        return fnmatch.fnmatchcase(value, query) if "*" in query else query in value
+    return [row["case_id"] for row in rows.values() if any(matches(row.get(field)) for field in SEARCH_FIELDS)]
+
+
+def check_all(index, rows):
+    for query in QUERIES:
+        assert index.search(query) == brute_force(rows, query), query
+
+
+@pytest.fixture
+def rng():
+    return random.Random(1234)
+
+
+def test_build_matches_a_full_scan(rng):
+    rows = {f"c{n}": random_case(rng, f"c{n}") for n in range(500)}
+    index = SearchIndex()
+    index.build(rows.values())
+    check_all(index, rows)
+
+
+def test_adds_updates_and_removes_match_a_full_scan(rng):
+    rows = {f"c{n}": random_case(rng, f"c{n}") for n in range(200)}
+    index = SearchIndex()
+    index.build(rows.values())
+    for n in range(300):
+        case_id = f"c{rng.randrange(260)}"
+        if case_id in rows and rng.random() < 0.4:
+            index.remove(case_id)
+            del rows[case_id]
+        else:
+            # A save re-adds the case at the end, as the store does.
+            index.remove(case_id)
+            rows.pop(case_id, None)
+            rows[case_id] = random_case(rng, case_id)
+            index.add(rows[case_id])
+        if n % 50 == 0:
+            check_all(index, rows)
+    check_all(index, rows)
+
+    index.build(rows.values())
+    check_all(index, rows)
+
+
+def test_extend_replaces_cases_already_indexed(rng):
+    rows = {f"c{n}": random_case(rng, f"c{n}") for n in range(100)}
+    index = SearchIndex()
+    index.build(rows.values())
+    loaded = [random_case(rng, f"c{n}") for n in range(90, 150)]
+    index.extend(loaded)
+    for row in loaded:
+        rows.pop(row["case_id"], None)
+        rows[row["case_id"]] = row
+    check_all(index, rows)
+
+
+def test_filter_narrows_earlier_results():
+    index = SearchIndex()
+    index.build([case("a1", "6912345678", "maria@gmail.com"), case("a2", "2101234567", "nikos@gmail.com"),
+                 case("a3", "6998765432", "eleni@example.gr")])
+    assert index.filter(index.search("*@gmail.com"), "69*") == ["a1"]
+    assert index.filter(["a3", "a1", "gone"], "ma") == ["a1"]
@@ -0,0 +1,94 @@
+import os
+
+import pytest
+
+from case_store import CaseStore
+from storage import CsvBackend
+
+QUERIES = ["69*", "*@gmail.com", "*mail*", "gmail", "c1", "*.gr", "6[89]*", "?2*", "nomatch"]
+
+
+def case(case_id, phone, email, comments=""):
+    return {"case_id": case_id, "timestamp": "2024-05-01 10:00:00", "phone_number": phone, "email": email,
+            "main_reaction": "", "main_response": "", "comments": comments}
+
+
+@pytest.fixture
+def path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return str(tmp_path / "cases.csv")
+
+
+@pytest.fixture
+def journaled(path):
+    """Compacted cases (with a snapshot), then saves and deletes left in the journal."""
+    store = CaseStore(CsvBackend(path))
+    store.save(case("c1", "6912345678", "maria@gmail.com"))
+    store.save(case("c2", "+30 6912345678", "Maria+crm@gmail.com"))
+    store.save(case("c3", "2101234567", "nikos@example.gr"))
+    store.save(case("c4", "6998765432", "eleni@mail.com"))
+    store.save(case("c5", "", ""))
+    store.close()
+    assert os.path.exists(path + ".snap")
+
+    store = CaseStore(CsvBackend(path))
+    store.save(case("c1", "6912345678", "maria@gmail.com", comments="edited"))
+    store.save(case("c3", "0030 6912345678", "nikos@example.gr"))
+    store.save(case("c6", "6911111111", "m.a.r.i.a@googlemail.com"))
+    store.delete("c4")
+    store.save(case("c7", "6977777777", "eleni@mail.com"))
+    store.delete("c7")
+    # Leave the writes in the journal instead of compacting them.
+    store.backend.journal.close()
+    store.history.close()
+    return path
+
+
+def open_snapshot(path):
+    snapshot = CsvBackend(path).snapshot()
+    assert snapshot is not None
+    return snapshot
+
+
+def test_snapshot_with_journal_answers_like_the_store(journaled):
+    snapshot = open_snapshot(journaled)
+    store = CaseStore(CsvBackend(journaled))
+    assert len(snapshot) == len(store) == 5
+    for query in QUERIES:
+        assert sorted(snapshot.search(query)) == sorted(store.search(query)), query
+    for email in ["maria@gmail.com", "nikos@example.gr", "eleni@mail.com", "nobody@example.com"]:
+        assert snapshot.email_count(email) == store.email_count(email), email
+    for phone in ["6912345678", "2101234567", "6998765432", "6977777777"]:
+        assert snapshot.phone_count(phone) == store.phone_count(phone), phone
+    for case_id in ["c1", "c2", "c3", "c4", "c5", "c6", "c7", "missing"]:
+        assert snapshot.get(case_id) == store.get(case_id), case_id
+    snapshot.close()
+    store.close()
+
+
+def test_journal_overlay_replaces_and_removes_rows(journaled):
+    snapshot = open_snapshot(journaled)
+    assert snapshot.get("c1")["comments"] == "edited"
+    assert snapshot.get("c4") is None
+    assert snapshot.get("c7") is None
+    assert snapshot.phone_count("6912345678") == 3
+    assert snapshot.email_count("maria@gmail.com") == 3
+    assert "c4" not in snapshot.search("*mail*")
+    snapshot.close()
+
+
+def test_stale_snapshot_is_ignored(journaled):
+    with open(journaled, "a", encoding="utf-8") as f:
+        f.write("\n")
+    assert CsvBackend(journaled).snapshot() is None
+
+
+def test_reads_after_close_go_to_the_successor(journaled):
+    store = CaseStore(CsvBackend(journaled), autoload=False)
+    snapshot = store.open_snapshot()
+    assert store.reader is snapshot
+    store.load()
+    assert store.reader is store
+    assert snapshot.search("c1") == ["c1"]
+    assert snapshot.get("c1") == store.get("c1")
+    store.close()